@@ -1,26 +1,588 @@
 
+import numbers
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# GF(2) polynomial helpers. Polynomials are held as python ints with bit i
+# being the coefficient of x^i.
+
+def poly_from_bits(bits):
+    poly = 0
+    for bit in bits:
+        poly |= 1 << bit
+    return poly
+
+
+if hasattr(int, "bit_count"):
+    def parity(data):
+        return data.bit_count() & 1
+else:
+    def parity(data):
+        return bin(data).count("1") & 1
+
+
+@lru_cache(maxsize=1)
+def parity_table():
+    # parity of every 16 bit value, for the table driven xor_reduce
+    return bytes(bin(v).count("1") & 1 for v in range(2**16))
+
+
+@lru_cache(maxsize=64)
+def char_poly(poly, length):
+    # The register shifts left and feeds back into bit 0, so a tap on state
+    # bit b reads the output from b+1 steps ago:
+    #   s(t+length) = sum over taps of s(t+length-1-b)
+    f = 1 << length
+    for bit in range(length):
+        if (poly >> bit) & 1:
+            f ^= 1 << (length - 1 - bit)
+    return f
+
+
+def gf2_mulmod(a, b, f):
+    deg = f.bit_length() - 1
+    res = 0
+    while b:
+        if b & 1:
+            res ^= a
+        b >>= 1
+        a <<= 1
+        if (a >> deg) & 1:
+            a ^= f
+    return res
+
+
+def gf2_powmod(a, e, f):
+    deg = f.bit_length() - 1
+    res = 1
+    if deg == 0:
+        return 0
+    while e:
+        if e & 1:
+            res = gf2_mulmod(res, a, f)
+        a = gf2_mulmod(a, a, f)
+        e >>= 1
+    return res
+
+
+@lru_cache(maxsize=64)
+def jump_table(poly, length):
+    # x^(2^i) modulo the characteristic polynomial for i < 64
+    f = char_poly(poly, length)
+    table = [gf2_powmod(2, 1, f)]
+    for _ in range(63):
+        table.append(gf2_mulmod(table[-1], table[-1], f))
+    return tuple(table)
+
+
+def lfsr_state_at(state, poly, length, n):
+    # Jump n steps in O(length^2 log n): reduce x^n modulo the characteristic
+    # polynomial to r(x), then by Cayley-Hamilton the state after n steps is
+    # the sum of the states after i steps for every r_i that is set.
+    mask = 2**length-1
+    f = char_poly(poly, length)
+    if n < 2**64:
+        r = 1
+        for i, square in enumerate(jump_table(poly, length)):
+            if (n >> i) & 1:
+                r = gf2_mulmod(r, square, f)
+    else:
+        r = gf2_powmod(2, n, f)
+    res = 0
+    for i in range(length):
+        if (r >> i) & 1:
+            res ^= state
+        state = ((state << 1) | parity(state & poly)) & mask
+    return res
+
+
+# Distinct prime factors of 2^n-1, the maximal period of an n bit register.
+PERIOD_FACTORS = {
+    1: (),
+    2: (3,),
+    3: (7,),
+    4: (3, 5),
+    5: (31,),
+    6: (3, 7),
+    7: (127,),
+    8: (3, 5, 17),
+    9: (7, 73),
+    10: (3, 11, 31),
+    11: (23, 89),
+    12: (3, 5, 7, 13),
+    13: (8191,),
+    14: (3, 43, 127),
+    15: (7, 31, 151),
+    16: (3, 5, 17, 257),
+    17: (131071,),
+    18: (3, 7, 19, 73),
+    19: (524287,),
+    20: (3, 5, 11, 31, 41),
+    21: (7, 127, 337),
+    22: (3, 23, 89, 683),
+    23: (47, 178481),
+    24: (3, 5, 7, 13, 17, 241),
+    25: (31, 601, 1801),
+    26: (3, 2731, 8191),
+    27: (7, 73, 262657),
+    28: (3, 5, 29, 43, 113, 127),
+    29: (233, 1103, 2089),
+    30: (3, 7, 11, 31, 151, 331),
+    31: (2147483647,),
+    32: (3, 5, 17, 257, 65537),
+    33: (7, 23, 89, 599479),
+    34: (3, 43691, 131071),
+    35: (31, 71, 127, 122921),
+    36: (3, 5, 7, 13, 19, 37, 73, 109),
+    37: (223, 616318177),
+    38: (3, 174763, 524287),
+    39: (7, 79, 8191, 121369),
+    40: (3, 5, 11, 17, 31, 41, 61681),
+    41: (13367, 164511353),
+    42: (3, 7, 43, 127, 337, 5419),
+    43: (431, 9719, 2099863),
+    44: (3, 5, 23, 89, 397, 683, 2113),
+    45: (7, 31, 73, 151, 631, 23311),
+    46: (3, 47, 178481, 2796203),
+    47: (2351, 4513, 13264529),
+    48: (3, 5, 7, 13, 17, 97, 241, 257, 673),
+    49: (127, 4432676798593),
+    50: (3, 11, 31, 251, 601, 1801, 4051),
+    51: (7, 103, 2143, 11119, 131071),
+    52: (3, 5, 53, 157, 1613, 2731, 8191),
+    53: (6361, 69431, 20394401),
+    54: (3, 7, 19, 73, 87211, 262657),
+    55: (23, 31, 89, 881, 3191, 201961),
+    56: (3, 5, 17, 29, 43, 113, 127, 15790321),
+    57: (7, 32377, 524287, 1212847),
+    58: (3, 59, 233, 1103, 2089, 3033169),
+    59: (179951, 3203431780337),
+    60: (3, 5, 7, 11, 13, 31, 41, 61, 151, 331, 1321),
+    61: (2305843009213693951,),
+    62: (3, 715827883, 2147483647),
+    63: (7, 73, 127, 337, 92737, 649657),
+    64: (3, 5, 17, 257, 641, 65537, 6700417),
+}
+
+
+def verify_period(poly_bits, length):
+    # The register is maximal length iff its characteristic polynomial is
+    # primitive, i.e. x has order exactly 2^length-1 modulo it.
+    if length not in PERIOD_FACTORS:
+        raise ValueError("no factor table for length %d, use brute_period()" % length)
+
+    f = char_poly(poly_from_bits(poly_bits), length)
+    if not f & 1:
+        return False
+
+    period = 2**length-1
+    if gf2_powmod(2, period, f) != 1:
+        return False
+    for q in PERIOD_FACTORS[length]:
+        if gf2_powmod(2, period // q, f) == 1:
+            return False
+    return True
+
+
+def brute_period(poly_bits, length, start=1, limit=None):
+    # Step a register until it returns to start. Returns None if limit steps
+    # pass first.
+    lfsr = lfsr_example(start, poly_bits, 2**length-1)
+    count = 0
+    while limit is None or count < limit:
+        lfsr.step()
+        count += 1
+        if lfsr.lfsr == start:
+            return count
+    return None
+
+
+def gf2_solver(vectors):
+    # Reduce vectors to echelon form, remembering which inputs make up each
+    # row, so solve(w) returns the mask of inputs that XOR to w (or None).
+    rows = []
+    for i, vec in enumerate(vectors):
+        comb = 1 << i
+        for row, row_comb in rows:
+            if vec ^ row < vec:
+                vec ^= row
+                comb ^= row_comb
+        if vec:
+            rows.append((vec, comb))
+    rows.sort(reverse=True)
+
+    def solve(w):
+        comb = 0
+        for row, row_comb in rows:
+            if w ^ row < w:
+                w ^= row
+                comb ^= row_comb
+        return None if w else comb
+    return solve
+
+
+@lru_cache(maxsize=16)
+def locate_tables(poly_bits, length, start):
+    poly = poly_from_bits(poly_bits)
+    lfsr_mask = 2**length-1
+    period = 2**length-1
+    if not verify_period(poly_bits, length):
+        raise ValueError("locate() needs a maximal length polynomial")
+
+    states = []
+    state = start
+    for _ in range(length):
+        states.append(state)
+        state = ((state << 1) | parity(state & poly)) & lfsr_mask
+
+    # short registers: a plain state -> steps lookup
+    table = None
+    if np is not None and length <= LOCATE_TABLE_MAX:
+        bits, _ = lfsr_generate(start, poly, length, period - 1, packed=False)
+        seq = np.concatenate(([(start >> k) & 1 for k in range(length - 1, -1, -1)], bits)).astype(np.int64)
+        index = np.zeros(period, dtype=np.int64)
+        for j in range(length):
+            index |= seq[length - 1 - j:length - 1 - j + period] << j
+        table = np.zeros(period + 1, dtype=np.int64)
+        table[index] = np.arange(period)
+
+    factors = []
+    for q in PERIOD_FACTORS[length]:
+        e = 0
+        n = period
+        while n % q == 0:
+            n //= q
+            e += 1
+        factors.append((q, e))
+
+    return gf2_solver(states), table, char_poly(poly, length), factors
+
+
+# registers up to this length are located with a lookup table
+LOCATE_TABLE_MAX = 20
+
+
+@lru_cache(maxsize=64)
+def bsgs_table(gamma, q, f):
+    m = int(q**0.5) + 1
+    baby = {}
+    e = 1
+    for j in range(m):
+        baby.setdefault(e, j)
+        e = gf2_mulmod(e, gamma, f)
+    return m, baby
+
+
+def gf2_dlog(c, f, period, factors):
+    # Pohlig-Hellman: solve x^k = c for each prime power of the period with
+    # baby-step giant-step, then combine with the CRT.
+    k = 0
+    modulus = 1
+    for q, e in factors:
+        gamma = gf2_powmod(2, period // q, f)
+        m, baby = bsgs_table(gamma, q, f)
+        giant = gf2_powmod(gamma, q - m % q, f)
+
+        x = 0
+        for i in range(e):
+            h = gf2_mulmod(gf2_powmod(2, period - x, f), c, f)
+            h = gf2_powmod(h, period // q**(i + 1), f)
+            for g in range(m):
+                if h in baby:
+                    d = (g * m + baby[h]) % q
+                    break
+                h = gf2_mulmod(h, giant, f)
+            else:
+                raise ValueError("discrete log failed")
+            x += d * q**i
+
+        qe = q**e
+        k += modulus * ((x - k) * pow(modulus, -1, qe) % qe)
+        modulus *= qe
+    return k % period
+
+
+def locate(window, poly_bits, length, start=1):
+    # Position of a length bit window in the sequence generated from start,
+    # as an index into generate() output. window is either a list of bits,
+    # oldest first, or the register value holding them (an int or numpy
+    # integer).
+    if isinstance(window, numbers.Integral):
+        window = int(window)
+    else:
+        bits = window
+        window = 0
+        for bit in bits:
+            window = (window << 1) | int(bit)
+    if not window:
+        raise ValueError("the all zero window is not in the sequence")
+
+    solve, table, f, factors = locate_tables(tuple(poly_bits), length, start)
+    period = 2**length-1
+    if table is not None:
+        steps = int(table[window])
+    else:
+        steps = gf2_dlog(solve(window), f, period, factors)
+    return (steps - length) % period
+
+
+def berlekamp_massey(bits):
+    # Shortest connection polynomial C(x) (bit i = coefficient of x^i) with
+    # s(n) = sum of C_i s(n-i), and its length.
+    c = 1
+    b = 1
+    length = 0
+    m = 1
+    window = 0
+    for n, bit in enumerate(bits):
+        window = (window << 1) | int(bit)
+        if not parity(c & window):
+            m += 1
+        elif 2 * length <= n:
+            t = c
+            c ^= b << m
+            length = n + 1 - length
+            b = t
+            m = 1
+        else:
+            c ^= b << m
+            m += 1
+    return c, length
+
+
+def identify(bits):
+    # Shortest LFSR that produces a capture: (poly_bits, length, state) where
+    # state is the register after the last captured bit, so
+    # lfsr_example(state, poly_bits, 2**length-1) carries on the stream.
+    bits = [int(bit) for bit in bits]
+    c, length = berlekamp_massey(bits)
+    if length == 0:
+        raise ValueError("capture is all zeros")
+    if 2 * length > len(bits):
+        raise ValueError("need at least %d bits to identify a %d bit register" % (2 * length, length))
+
+    poly_bits = tuple(i - 1 for i in range(length, 0, -1) if (c >> i) & 1)
+    state = 0
+    for bit in bits[-length:]:
+        state = (state << 1) | bit
+    return poly_bits, length, state
+
+
+def identify_windows(bits, max_length=64, window=None):
+    # Error tolerant identify(): run it over consecutive windows and keep the
+    # register most windows agree on. A few bit errors only spoil the windows
+    # they land in. The state is jumped from the end of the last agreeing
+    # window to the end of the capture.
+    bits = [int(bit) for bit in bits]
+    if window is None:
+        window = 2 * max_length + 16
+
+    votes = {}
+    for lo in range(0, len(bits) - window + 1, window):
+        try:
+            poly_bits, length, state = identify(bits[lo:lo + window])
+        except ValueError:
+            continue
+        if length > max_length:
+            continue
+        count, _ = votes.get((poly_bits, length), (0, None))
+        votes[(poly_bits, length)] = (count + 1, (lo + window, state))
+
+    if not votes:
+        raise ValueError("no window identified a register of up to %d bits" % max_length)
+    (poly_bits, length), (_, (end, state)) = max(votes.items(), key=lambda item: item[1][0])
+    state = lfsr_state_at(state, poly_from_bits(poly_bits), length, len(bits) - end)
+    return poly_bits, length, state
+
+
+@lru_cache(maxsize=64)
+def word_tables(poly, length, width):
+    # Advancing the register by width steps is linear in the state, so split
+    # the state into bytes and precompute what each byte value contributes.
+    # Entries hold the register shifted left by width with the new bits below
+    # it, i.e. (state << width) | output bits.
+    basis = []
+    for i in range(length):
+        ext = 1 << i
+        for _ in range(width):
+            ext = (ext << 1) | parity(ext & poly)
+        basis.append(ext)
+
+    tables = []
+    for lane in range(0, length, 8):
+        table = [0] * 256
+        for v in range(1, 256):
+            low = (v & -v).bit_length() - 1
+            if lane + low < length:
+                table[v] = table[v & (v - 1)] ^ basis[lane + low]
+            else:
+                table[v] = table[v & (v - 1)]
+        tables.append(table)
+    return tuple(tables)
+
+
+def lfsr_step_word(state, poly, length, width):
+    ext = 0
+    for table in word_tables(poly, length, width):
+        ext ^= table[state & 0xFF]
+        state >>= 8
+    return ext & (2**length-1), ext & (2**width-1)
+
+
+def lfsr_recurrence(seq, poly, length):
+    # Fill seq from index length on, given the first length entries. The
+    # output sequence obeys
+    #   a(t) = sum over taps of a(t-1-b)
+    # and since f(x)^(2^k) = f(x^(2^k)) over GF(2) it also obeys the same
+    # recurrence with every lag scaled by 2^k. Each numpy slice XOR therefore
+    # produces (shortest lag * 2^k) entries, doubling k as the history allows.
+    # Only XOR is used, so entries can be single bits or bit sliced words.
+    lags = [bit + 1 for bit in range(length) if (poly >> bit) & 1]
+    total = len(seq)
+    pos = length
+    scale = 1
+    while pos < total:
+        # f^(2^k) relations are only valid once the history covers them
+        while pos >= length + max(lags) * (2 * scale - 1):
+            scale *= 2
+        end = min(pos + min(lags) * scale, total)
+        block = seq[pos - lags[0] * scale:end - lags[0] * scale].copy()
+        for lag in lags[1:]:
+            block ^= seq[pos - lag * scale:end - lag * scale]
+        seq[pos:end] = block
+        pos = end
+
+
+def lfsr_generate(state, poly, length, n_bits, packed=True):
+    # Bulk generation with numpy, see lfsr_recurrence()
+    if np is None:
+        raise ImportError("lfsr_generate requires numpy")
+
+    total = length + n_bits
+    seq = np.empty(total, dtype=np.uint8)
+    for k in range(length):
+        seq[length - 1 - k] = (state >> k) & 1
+    lfsr_recurrence(seq, poly, length)
+
+    state = 0
+    for bit in seq[total - length:]:
+        state = (state << 1) | int(bit)
+
+    bits = seq[length:]
+    if packed:
+        return np.packbits(bits), state
+    return bits, state
+
+
+def lfsr_states(state, poly, length, n):
+    # The register after each of the next n steps as a uint64 array, for
+    # length <= 64. Step k leaves the last length bits of the sequence in
+    # the register, newest in bit 0. Returns (states, final state).
+    if length > 64:
+        raise ValueError("lfsr_states needs length <= 64")
+    bits, final = lfsr_generate(state, poly, length, n, packed=False)
+
+    seq = np.empty(length + n, dtype=np.uint64)
+    for k in range(length):
+        seq[length - 1 - k] = (state >> k) & 1
+    seq[length:] = bits
+
+    states = np.zeros(n, dtype=np.uint64)
+    for k in range(length):
+        states |= seq[length - k:length - k + n] << np.uint64(k)
+    return states, final
+
+
+def lfsr_generate_sliced(states, poly, length, n_bits):
+    # Up to 64 registers sharing a polynomial, bit sliced: word t of the
+    # result holds output bit t of lane j in bit j. One uint64 XOR advances
+    # every lane; see prbs_model.prbs_mon_lanes for what that buys.
+    if np is None:
+        raise ImportError("lfsr_generate_sliced requires numpy")
+    if len(states) > 64:
+        raise ValueError("at most 64 lanes fit in a bit sliced word")
+
+    total = length + n_bits
+    seq = np.empty(total, dtype=np.uint64)
+    for k in range(length):
+        word = 0
+        for lane, state in enumerate(states):
+            word |= ((state >> k) & 1) << lane
+        seq[length - 1 - k] = word
+    lfsr_recurrence(seq, poly, length)
+
+    tail = [int(word) for word in seq[total - length:]]
+    lanes = len(states)
+    states = []
+    for lane in range(lanes):
+        state = 0
+        for word in tail:
+            state = (state << 1) | ((word >> lane) & 1)
+        states.append(state)
+    return seq[length:], states
+
+
+def slice_lanes(bits):
+    # lanes x bits uint8 array (up to 64 lanes) to one uint64 word per bit
+    # with lane j in bit j
+    bits = np.asarray(bits, dtype=np.uint8)
+    lanes, n = bits.shape
+    if lanes > 64:
+        raise ValueError("at most 64 lanes fit in a bit sliced word")
+    out = np.zeros((n, 8), dtype=np.uint8)
+    for byte in range((lanes + 7) // 8):
+        acc = np.zeros(n, dtype=np.uint8)
+        for j in range(8 * byte, min(8 * byte + 8, lanes)):
+            acc |= bits[j] << np.uint8(j % 8)
+        out[:, byte] = acc
+    return out.view("<u8").ravel()
+
+
+def unslice_lanes(words, lanes):
+    words = np.asarray(words, dtype=np.uint64)
+    return np.array([(words >> np.uint64(j)) & np.uint64(1) for j in range(lanes)], dtype=np.uint8)
+
 
 class lfsr_rtl:
 
-    def __init__(self, start, length, poly, mask):
+    # xor_reduce kernels, "loop" (the default) walks the bits like XOR_REDUCE
+    # in the RTL, the others are faster ways to the same result
+    PARITY = ("loop", "popcount", "table")
+
+    def __init__(self, start, length, poly, mask, parity="loop", invert=False):
         self.lfsr = start
         self.len  = length
         self.mask = mask
         self.poly = poly
+        # invert the output bits, not the register; count0/count1 count
+        # the output
+        self.invert = int(invert)
+        if parity not in self.PARITY:
+            raise ValueError("unknown parity kernel %r" % (parity,))
+        self.xor_reduce = getattr(self, "xor_reduce_" + parity)
+        if parity == "table":
+            self.parity_table = parity_table()
         self.count0 = 0
         self.count1 = 0
+        # steps skipped by jump(), these are not included in count0/count1
+        self.jumped = 0
 
     def step(self):
         lfsr_masked = self.lfsr & self.poly
         newbit = self.xor_reduce(lfsr_masked, self.len)
         self.lfsr = ((self.lfsr << 1) | newbit) & self.mask
 
-        if newbit == 0:
+        if newbit == self.invert:
             self.count0 += 1
         else:
             self.count1 += 1
 
-    def xor_reduce(self, data, len):
+    def xor_reduce_loop(self, data, len):
         ldata = data
         res = data & 1
         for i in range(len):
@@ -28,15 +590,64 @@ class lfsr_rtl:
             res = res ^ (ldata & 1)
         return res
 
+    def xor_reduce_popcount(self, data, len):
+        return parity(data)
+
+    def xor_reduce_table(self, data, len):
+        res = 0
+        while data:
+            res ^= self.parity_table[data & 0xFFFF]
+            data >>= 16
+        return res
+
+    def step_word(self, width):
+        # Advance width steps and return the new bits, oldest in the MSB, the
+        # order prbs_gen data_out is meant to have. The RTL does not do this
+        # yet for DATA_W > 1, see the note on prbs_model.prbs_gen.
+        self.lfsr, word = lfsr_step_word(self.lfsr, self.poly, self.len, width)
+        if self.invert:
+            word ^= 2**width-1
+        ones = bin(word).count("1")
+        self.count0 += width - ones
+        self.count1 += ones
+        return word
+
+    def generate(self, n_bits, packed=True):
+        # Advance n_bits steps and return the output bits as a numpy uint8
+        # array, oldest bit first. packed=True packs them MSB first.
+        bits, self.lfsr = lfsr_generate(self.lfsr, self.poly, self.len, n_bits, packed=False)
+        if self.invert:
+            bits ^= 1
+        ones = int(np.count_nonzero(bits))
+        self.count0 += n_bits - ones
+        self.count1 += ones
+        if packed:
+            return np.packbits(bits)
+        return bits
+
+    def state_at(self, n):
+        return lfsr_state_at(self.lfsr, self.poly, self.len, n)
+
+    def jump(self, n):
+        self.lfsr = self.state_at(n)
+        self.jumped += n
+
 
 class lfsr_example:
 
-    def __init__(self, start, bits, mask):
+    def __init__(self, start, bits, mask, invert=False):
         self.lfsr = start
         self.mask = mask
         self.poly_bits = bits
+        self.poly = poly_from_bits(bits)
+        self.len  = mask.bit_length()
+        # invert the output bits, not the register; count0/count1 count
+        # the output
+        self.invert = int(invert)
         self.count0 = 0
         self.count1 = 0
+        # steps skipped by jump(), these are not included in count0/count1
+        self.jumped = 0
 
     def step(self):
         newbit = 0
@@ -45,13 +656,230 @@ class lfsr_example:
         newbit = newbit & 1
         self.lfsr = ((self.lfsr << 1) | newbit) & self.mask
 
-        if newbit == 0:
+        if newbit == self.invert:
             self.count0 += 1
         else:
             self.count1 += 1
 
+    def step_word(self, width):
+        # Advance width steps and return the new bits, oldest in the MSB, the
+        # order prbs_gen data_out is meant to have. The RTL does not do this
+        # yet for DATA_W > 1, see the note on prbs_model.prbs_gen.
+        self.lfsr, word = lfsr_step_word(self.lfsr, self.poly, self.len, width)
+        if self.invert:
+            word ^= 2**width-1
+        ones = bin(word).count("1")
+        self.count0 += width - ones
+        self.count1 += ones
+        return word
+
+    def generate(self, n_bits, packed=True):
+        # Advance n_bits steps and return the output bits as a numpy uint8
+        # array, oldest bit first. packed=True packs them MSB first.
+        bits, self.lfsr = lfsr_generate(self.lfsr, self.poly, self.len, n_bits, packed=False)
+        if self.invert:
+            bits ^= 1
+        ones = int(np.count_nonzero(bits))
+        self.count0 += n_bits - ones
+        self.count1 += ones
+        if packed:
+            return np.packbits(bits)
+        return bits
+
+    def state_at(self, n):
+        return lfsr_state_at(self.lfsr, self.poly, self.len, n)
+
+    def jump(self, n):
+        self.lfsr = self.state_at(n)
+        self.jumped += n
+
+
+class prbs_stream:
+
+    # Chunked reader on top of lfsr_rtl/lfsr_example. Bytes are packed MSB
+    # first in sequence order; memory use is one chunk. checkpoint() returns
+    # (state, position), feed it back to restore() to resume.
+
+    def __init__(self, model, chunk_bytes=65536, position=0):
+        self.model = model
+        self.chunk_bytes = chunk_bytes
+        self.position = position
+
+    def read(self, n_bits):
+        # A trailing partial byte is zero padded.
+        if np is not None:
+            data = self.model.generate(n_bits, packed=True).tobytes()
+        else:
+            data = bytearray()
+            for _ in range(n_bits // 8):
+                data.append(self.model.step_word(8))
+            if n_bits % 8:
+                data.append(self.model.step_word(n_bits % 8) << (8 - n_bits % 8))
+            data = bytes(data)
+        self.position += n_bits
+        return data
+
+    def chunks(self, n_bits=None):
+        # Yield chunk_bytes sized chunks forever, or until n_bits are out.
+        while n_bits is None or n_bits > 0:
+            size = self.chunk_bytes * 8
+            if n_bits is not None:
+                size = min(size, n_bits)
+                n_bits -= size
+            yield self.read(size)
+
+    def __iter__(self):
+        return self.chunks()
+
+    def checkpoint(self):
+        return (self.model.lfsr, self.position)
+
+    def restore(self, checkpoint):
+        self.model.lfsr, self.position = checkpoint
+
+
+class prbs_poly:
+
+    # A registry entry: taps as used by lfsr_example, register length and
+    # whether the pattern is sent inverted (ITU-T O.150 PRBS15/23/31). The
+    # models from example() and rtl() invert their output to match; pass
+    # invert to prbs_model.prbs_mon and prbs_cache.window() as well.
+
+    def __init__(self, name, poly_bits, length, invert=False):
+        self.name = name
+        self.poly_bits = tuple(poly_bits)
+        self.length = length
+        self.invert = invert
+        self.poly = poly_from_bits(poly_bits)
+        self.mask = 2**length-1
+        self.period = 2**length-1
+        if not verify_period(poly_bits, length):
+            raise ValueError("%s is not maximal length" % name)
+
+    def example(self, start=1):
+        return lfsr_example(start, self.poly_bits, self.mask, self.invert)
+
+    def rtl(self, start=1, parity="loop"):
+        return lfsr_rtl(start, self.length, self.poly, self.mask, parity, self.invert)
+
+    def __repr__(self):
+        return "prbs_poly(%r, %r, %d, invert=%r)" % (self.name, self.poly_bits, self.length, self.invert)
+
+
+PRBS = {}
+for _name, _bits, _length, _invert in (
+    ("PRBS7",      (6, 5),          7, False),
+    ("PRBS9",      (8, 4),          9, False),
+    ("PRBS11",     (10, 8),        11, False),
+    ("PRBS13",     (12, 11, 1, 0), 13, False),
+    ("PRBS15",     (14, 13),       15, False),
+    ("PRBS20",     (19, 2),        20, False),
+    ("PRBS23",     (22, 17),       23, False),
+    ("PRBS31",     (30, 27),       31, False),
+    ("PRBS15_INV", (14, 13),       15, True),
+    ("PRBS23_INV", (22, 17),       23, True),
+    ("PRBS31_INV", (30, 27),       31, True),
+):
+    PRBS[_name] = prbs_poly(_name, _bits, _length, _invert)
+
+
+def lookup(poly_bits, length):
+    # Registry name of a polynomial, None if it is not a standard one.
+    for name, prbs in PRBS.items():
+        if prbs.poly_bits == tuple(poly_bits) and prbs.length == length and not prbs.invert:
+            return name
+    return None
+
+
+def clear_caches():
+    # Drop every lazily built per-polynomial table.
+    for cached in (parity_table, char_poly, jump_table, word_tables, locate_tables, bsgs_table):
+        cached.cache_clear()
+
+
+def sweep_segment(start, length, poly_bits, first, count):
+    # Check count steps of lfsr_rtl against lfsr_example from position first.
+    # Returns a report dict that sweep() merges.
+    poly_mask = poly_from_bits(poly_bits)
+    lfsr_mask = 2**length-1
+    state = lfsr_state_at(start, poly_mask, length, first)
+
+    lfsr0 = lfsr_example(state, poly_bits, lfsr_mask)
+    lfsr1 = lfsr_rtl(state, length, poly_mask, lfsr_mask, parity="loop")
+
+    mismatch = None
+    for i in range(count):
+        lfsr0.step()
+        lfsr1.step()
+        if lfsr0.lfsr != lfsr1.lfsr:
+            mismatch = (first + i + 1, lfsr0.lfsr, lfsr1.lfsr)
+            break
+
+    return {
+        "first": first,
+        "count": count,
+        "mismatch": mismatch,
+        "end": lfsr0.lfsr,
+        "count0": (lfsr0.count0, lfsr1.count0),
+        "count1": (lfsr0.count1, lfsr1.count1),
+    }
+
+
+def sweep(start, length, poly_bits, segments, processes=None, steps=None):
+    # Split steps (default one full period) into segments, seed each one with
+    # a jump-ahead start state and check them in a process pool.
+    from multiprocessing import Pool
+
+    if steps is None:
+        steps = 2**length-1
+    bounds = [steps * i // segments for i in range(segments + 1)]
+    jobs = [(start, length, poly_bits, bounds[i], bounds[i+1] - bounds[i]) for i in range(segments)]
+
+    with Pool(processes) as pool:
+        reports = pool.starmap(sweep_segment, jobs)
+
+    mismatches = [r["mismatch"] for r in reports if r["mismatch"] is not None]
+    # every segment has to end where the next one was seeded
+    poly_mask = poly_from_bits(poly_bits)
+    for r in reports:
+        if r["mismatch"] is None:
+            expect = lfsr_state_at(start, poly_mask, length, r["first"] + r["count"])
+            if r["end"] != expect:
+                mismatches.append((r["first"] + r["count"], expect, r["end"]))
+
+    return {
+        "steps": steps,
+        "mismatches": sorted(mismatches),
+        "end": reports[-1]["end"],
+        "count0": tuple(sum(r["count0"][i] for r in reports) for i in range(2)),
+        "count1": tuple(sum(r["count1"][i] for r in reports) for i in range(2)),
+    }
+
+
+
+def benchmark(polys, steps=100000):
+    # steps/second of each model and xor_reduce kernel, polys maps a name to
+    # (poly_bits, length)
+    import time
+
+    rows = []
+    for name, (poly_bits, length) in polys.items():
+        lfsr_mask = 2**length-1
+        models = [("lfsr_example", lfsr_example(1, poly_bits, lfsr_mask))]
+        for kernel in lfsr_rtl.PARITY:
+            models.append(("lfsr_rtl/" + kernel, lfsr_rtl(1, length, poly_from_bits(poly_bits), lfsr_mask, kernel)))
+
+        for model, lfsr in models:
+            t0 = time.perf_counter()
+            for _ in range(steps):
+                lfsr.step()
+            rows.append((name, model, steps / (time.perf_counter() - t0)))
+    return rows
+
+
 if __name__ == '__main__':
     # Execute when the module is not initialized from an import statement.
+    import sys
 
     start = 0x2
     
@@ -66,13 +894,42 @@ if __name__ == '__main__':
     
     for bit in poly_bits:
         poly_mask += 1 << bit
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else "period"
+
+    if mode == "period":
+        print("expected repition period is", hex(lfsr_mask))
+        print("maximal length:", verify_period(poly_bits, lfsr_length))
+        print("LFSR1 period state:", hex(lfsr_rtl(start, lfsr_length, poly_mask, lfsr_mask).state_at(lfsr_mask)))
+        sys.exit(0)
+
+    if mode == "bench":
+        polys = {name: (prbs.poly_bits, prbs.length) for name, prbs in PRBS.items() if not prbs.invert}
+        for name, model, rate in benchmark(polys):
+            print("%-8s %-22s %12.0f steps/s" % (name, model, rate))
+        sys.exit(0)
+
+    if mode == "sweep":
+        # python prbs31.py sweep [segments [processes]]
+        segments = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+        processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        report = sweep(start, lfsr_length, poly_bits, segments, processes)
+        for position, state0, state1 in report["mismatches"]:
+            print("lfsr mismatch at", hex(position), hex(state0), hex(state1))
+        print("expected repition period is", hex(lfsr_mask))
+        print("returned to start:", report["end"] == start)
+        print("LFSR0 Zeros: ", report["count0"][0])
+        print("LFSR0 Ones: ", report["count1"][0])
+        print("LFSR1 Zeros: ", report["count0"][1])
+        print("LFSR1 Ones: ", report["count1"][1])
+        sys.exit(0)
     
     count_zeros = 0
     count_ones = 0
 
 
     lfsr0 = lfsr_example(start, poly_bits, lfsr_mask)
-    lfsr1 = lfsr_rtl(start, lfsr_length, poly_mask, lfsr_mask)
+    lfsr1 = lfsr_rtl(start, lfsr_length, poly_mask, lfsr_mask, parity="loop")
 
 
     while True:
@@ -0,0 +1,263 @@
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import cocotb
+from cocotb.triggers import First, RisingEdge, Timer
+from cocotb.utils import get_sim_time
+
+import prbs31
+import prbs_sim
+
+
+# Fixed simulation workloads, run one at a time so they do not compete for
+# cores. Each runs the bench_loopback test below in its own simulator and
+# appends a record to a JSON history; compare flags workloads that got
+# slower between two records.
+
+# The RTL only works at DATA_W = 1 for now: at 8 the monitor's sync reload
+# does not fit the register, at 32 sync_bits cannot count DATA_W and never
+# drains. Those workloads are expected to fail and only run when named, so
+# a default run measures DATA_W = 1 alone; run() says so and each history
+# record lists the widths it covers under "data_w".
+WORKLOADS = [
+    {"name": "loopback_w%d_%s" % (data_w, prbs.lower()), "prbs": prbs, "data_w": data_w,
+     "expect_fail": data_w > 1}
+    for data_w in (1, 8, 32) for prbs in ("PRBS13", "PRBS31")
+]
+
+# metrics compare checks, and whether a larger value is worse
+METRICS = {"cycles_per_s": False, "callbacks_per_cycle": True, "peak_rss_kb": True}
+
+
+def generics(workload):
+    # the generator register has to hold a whole data word
+    return {"DATA_W": workload["data_w"], "GENERATOR_W": max(31, workload["data_w"]),
+            "TOGGLE_CONTROL": "true"}
+
+
+class callback_counter:
+
+    # Counts the GPI callbacks registered from Python by wrapping the
+    # register_* functions of cocotb.simulator. Clocks started with Clock()
+    # run in the GPI layer and do not show up here.
+
+    def __init__(self):
+        self.count = 0
+        self.saved = {}
+
+    def wrap(self, function):
+        def counted(*args, **kwargs):
+            self.count += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def __enter__(self):
+        for name in dir(cocotb.simulator):
+            if name.startswith("register_") and name.endswith("_callback"):
+                self.saved[name] = getattr(cocotb.simulator, name)
+                setattr(cocotb.simulator, name, self.wrap(self.saved[name]))
+        return self
+
+    def __exit__(self, *exc):
+        for name, function in self.saved.items():
+            setattr(cocotb.simulator, name, function)
+
+
+async def wall_clock(seconds, step):
+    # returns once seconds of wall time have passed, looking every step ns
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        await Timer(step, "ns")
+
+
+@cocotb.test()
+async def bench_loopback(dut):
+    # Loopback with continuous data_req through the same waits the tests
+    # use, so testbench changes show up in the numbers.
+    prbs = prbs31.PRBS[os.environ.get("PRBS_BENCH_PRBS", "PRBS31")]
+    values = int(os.environ.get("PRBS_BENCH_VALUES", "100000"))
+    timeout = float(os.environ.get("PRBS_BENCH_TIMEOUT", "600"))
+
+    tb = prbs_sim.loopback(dut, prbs, 1, 0, prbs_sim.TOGGLE_CONTROL)
+    await tb.reset("continuous")
+    await RisingEdge(dut.clk)
+
+    start_ns = get_sim_time("ns")
+    start = time.perf_counter()
+    with callback_counter() as counter:
+        # a build that never counts would otherwise wait for ever
+        clean = cocotb.start_soon(tb.clean(values))
+        watchdog = cocotb.start_soon(wall_clock(timeout, 100_000 * prbs_sim.CLK_PERIOD))
+        await First(clean, watchdog)
+    wall = time.perf_counter() - start
+    if not clean.done():
+        clean.kill()
+        assert False, "No result after %.0f s, data_count %s" % (wall, dut.data_count.value.binstr)
+    watchdog.kill()
+    cycles = (get_sim_time("ns") - start_ns) / prbs_sim.CLK_PERIOD
+
+    result = {
+        "values": values,
+        "cycles": cycles,
+        "wall": wall,
+        "cycles_per_s": cycles / wall if wall else 0.0,
+        "callbacks": counter.count,
+        "callbacks_per_cycle": counter.count / cycles if cycles else 0.0,
+        # the simulator process, Python runs inside it
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    dut._log.info("Bench: %s", result)
+
+    out = os.environ.get("PRBS_BENCH_OUT")
+    if out:
+        with open(out, "w") as f:
+            json.dump(result, f)
+
+
+def run(sim, values, workloads=WORKLOADS, out="sim_build", timeout=600):
+    from cocotb.runner import get_runner
+    import prbs_regress
+
+    out = os.path.abspath(out)
+    results = {}
+    for workload in workloads:
+        g = generics(workload)
+        test_dir = os.path.join(prbs_regress.build_dir(out, sim, g), "bench_" + workload["name"])
+        os.makedirs(test_dir, exist_ok=True)
+        metrics = os.path.join(test_dir, "bench.json")
+        if os.path.exists(metrics):
+            os.remove(metrics)
+
+        env = prbs_regress.generics_env(g)
+        env.update({"PRBS_BENCH_PRBS": workload["prbs"], "PRBS_BENCH_VALUES": str(values),
+                    "PRBS_BENCH_OUT": metrics, "PRBS_BENCH_TIMEOUT": str(timeout), "PRBS_PROGRESS": "0"})
+        start = time.perf_counter()
+        try:
+            prbs_regress.build(sim, g, out)
+            get_runner(sim).test(test_module="prbs_bench", hdl_toplevel="prbs_tb", hdl_toplevel_lang="vhdl",
+                                 testcase="bench_loopback", parameters=g, extra_env=env,
+                                 build_dir=prbs_regress.build_dir(out, sim, g), test_dir=test_dir,
+                                 log_file=os.path.join(test_dir, "sim.log"))
+        except (Exception, SystemExit) as e:
+            print("%-22s %s: %s" % (workload["name"], type(e).__name__, e))
+        total = time.perf_counter() - start
+
+        if not os.path.exists(metrics):
+            print("%-22s failed%s, see %s" % (workload["name"], " as expected" if workload["expect_fail"] else "",
+                                             os.path.join(test_dir, "sim.log")))
+            continue
+        with open(metrics) as f:
+            result = json.load(f)
+        result["process_wall"] = total
+        results[workload["name"]] = result
+        print("%-22s %12.0f cycles/s %8.3f callbacks/cycle %8d kB"
+              % (workload["name"], result["cycles_per_s"], result["callbacks_per_cycle"], result["peak_rss_kb"]))
+
+    measured = data_widths(workloads, results)
+    if len(measured) < 2:
+        print("Only DATA_W=%s measured, this is not a comparison across data widths; DATA_W > 1 fails in the RTL"
+              % ",".join(str(w) for w in measured))
+    return results
+
+
+def data_widths(workloads, results):
+    # the DATA_W values with at least one workload result
+    return sorted({w["data_w"] for w in workloads if w["name"] in results})
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return json.load(f)
+
+
+def append_history(filename, record):
+    history = load_history(filename)
+    history.append(record)
+    tmp = filename + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, filename)
+
+
+def compare(base, new, threshold=0.1):
+    # Regressions of new against base, one (workload, metric, base, new,
+    # change) per metric that got worse by more than threshold.
+    found = []
+    for name, metrics in new["results"].items():
+        if name not in base["results"]:
+            continue
+        for metric, larger_is_worse in METRICS.items():
+            a = base["results"][name].get(metric)
+            b = metrics.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            if (change > threshold) if larger_is_worse else (change < -threshold):
+                found.append((name, metric, a, b, change))
+    return found
+
+
+if __name__ == '__main__':
+    # python prbs_bench.py run --sim nvc --label "before refactor"
+    # python prbs_bench.py compare            (last two records)
+    parser = argparse.ArgumentParser(description="Simulation throughput benchmarks with a JSON history")
+    parser.add_argument("--history", default="bench_history.json")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_args = commands.add_parser("run")
+    run_args.add_argument("--sim", default=os.environ.get("SIM", "nvc"), choices=("nvc", "ghdl"))
+    run_args.add_argument("--values", type=int, default=100000)
+    run_args.add_argument("--workloads", nargs="+", help="workload names, default those expected to pass")
+    run_args.add_argument("--timeout", type=float, default=600, help="wall seconds per workload")
+    run_args.add_argument("--label", default="")
+
+    compare_args = commands.add_parser("compare")
+    compare_args.add_argument("base", nargs="?", type=int, default=-2, help="history index")
+    compare_args.add_argument("new", nargs="?", type=int, default=-1, help="history index")
+    compare_args.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        if args.workloads:
+            workloads = [w for w in WORKLOADS if w["name"] in args.workloads]
+        else:
+            workloads = [w for w in WORKLOADS if not w["expect_fail"]]
+        results = run(args.sim, args.values, workloads, timeout=args.timeout)
+        append_history(args.history, {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "label": args.label,
+                                      "commit": git_commit(), "sim": args.sim, "values": args.values,
+                                      "data_w": data_widths(workloads, results), "results": results})
+        expected = [w for w in workloads if not w["expect_fail"]]
+        sys.exit(0 if all(w["name"] in results for w in expected) else 1)
+
+    history = load_history(args.history)
+    if len(history) < 2:
+        sys.exit("need two records in %s to compare" % args.history)
+    base, new = history[args.base], history[args.new]
+    if (base["sim"], base["values"]) != (new["sim"], new["values"]):
+        print("warning: comparing %s/%d against %s/%d" % (base["sim"], base["values"], new["sim"], new["values"]))
+    print("DATA_W covered: %s against %s" % (base.get("data_w", "?"), new.get("data_w", "?")))
+
+    regressions = compare(base, new, args.threshold)
+    for name, metric, a, b, change in regressions:
+        print("%-22s %-20s %14.3f -> %14.3f (%+.1f%%)" % (name, metric, a, b, 100 * change))
+    if regressions:
+        sys.exit(1)
+    print("No regressions beyond %.0f%% (%s against %s)" % (100 * args.threshold, new.get("commit"), base.get("commit")))
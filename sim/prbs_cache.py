@@ -0,0 +1,121 @@
+
+import mmap
+import os
+
+import prbs31
+
+
+class prbs_cache:
+
+    # On-disk cache of full PRBS periods, packed MSB first in sequence order
+    # (bit 0 is the first output bit after start). Files are served through
+    # mmap and evicted least recently used first once the cache passes
+    # max_bytes. Evicted files have their maps closed unless a caller still
+    # holds a view of them.
+
+    def __init__(self, path=None, max_bytes=256 * 2**20, max_length=24):
+        if path is None:
+            path = os.environ.get("PRBS_CACHE_DIR",
+                                  os.path.join(os.path.expanduser("~"), ".cache", "prbs"))
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_length = max_length
+        self.maps = {}
+        os.makedirs(self.path, exist_ok=True)
+
+    def filename(self, poly_bits, length, start):
+        poly = prbs31.poly_from_bits(poly_bits)
+        return os.path.join(self.path, "prbs%d_%x_%x.bin" % (length, poly, start))
+
+    def get(self, poly_bits, length, start):
+        # Read only memoryview of the packed period, built on first use.
+        name = self.filename(poly_bits, length, start)
+
+        if name in self.maps:
+            if os.path.exists(name):
+                os.utime(name)
+                return self.maps[name][1]
+            # evicted by another process
+            self.release(name)
+
+        if not os.path.exists(name):
+            self.build(poly_bits, length, start, name)
+        else:
+            os.utime(name)
+
+        with open(name, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps[name] = (data, memoryview(data))
+        return self.maps[name][1]
+
+    def release(self, name):
+        data, view = self.maps.pop(name)
+        try:
+            view.release()
+            data.close()
+        except BufferError:
+            # still exported, e.g. to a numpy array; closed when that goes
+            pass
+
+    def close(self):
+        for name in list(self.maps):
+            self.release(name)
+
+    def window(self, poly_bits, length, start, first, n_bits, invert=False):
+        # n_bits of the sequence from position first as an unpacked numpy
+        # array, wrapping at the end of the period. invert gives the O.150
+        # inverted pattern from the same file.
+        np = prbs31.np
+        period = 2**length-1
+        data = np.frombuffer(self.get(poly_bits, length, start), dtype=np.uint8)
+
+        if n_bits <= 0:
+            return np.zeros(0, dtype=np.uint8)
+
+        first %= period
+        out = []
+        while n_bits > 0:
+            size = min(n_bits, period - first)
+            lo = first // 8
+            hi = (first + size + 7) // 8
+            bits = np.unpackbits(data[lo:hi])
+            out.append(bits[first - lo * 8:first - lo * 8 + size])
+            n_bits -= size
+            first = 0
+        bits = out[0] if len(out) == 1 else np.concatenate(out)
+        if invert:
+            bits = bits ^ 1
+        return bits
+
+    def build(self, poly_bits, length, start, name):
+        if length > self.max_length:
+            raise ValueError("PRBS%d is too long to cache, max_length is %d" % (length, self.max_length))
+
+        poly = prbs31.poly_from_bits(poly_bits)
+        data, _ = prbs31.lfsr_generate(start, poly, length, 2**length-1, packed=True)
+
+        tmp = name + ".%d.tmp" % os.getpid()
+        with open(tmp, "wb") as f:
+            f.write(data.tobytes())
+        os.replace(tmp, name)
+
+        self.evict(keep=name)
+
+    def evict(self, keep=None):
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".bin"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        for _, size, name in files:
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            os.remove(name)
+            if name in self.maps:
+                self.release(name)
+            total -= size
@@ -0,0 +1,197 @@
+
+import collections
+import os
+
+import cocotb
+from cocotb.triggers import Edge, RisingEdge, Timer
+from cocotb.utils import get_sim_time
+
+import prbs_vcd
+
+
+class wave_capture:
+
+    # Windowed waveform capture. Each prbs_tb signal but clk is watched with
+    # an Edge of its own and its changes go into a ring buffer that keeps
+    # the last before clocks, so nothing is read on a clock where nothing
+    # changed. An event writes that history and the next after clocks to a
+    # VCD file of their own, capture_<n>_<event>.vcd, in the layout
+    # prbs_vcd.vcd_reader reads; clk is not watched but drawn from its
+    # period and the time of a rising edge. Events are "error" (error_count
+    # moving off 0), "sync" (the monitor's sync_now) and "fail" (the test
+    # calls failed()).
+
+    def __init__(self, dut, period, events=("error", "sync", "fail"), before=1000, after=1000,
+                 limit=8, path=".", signals=prbs_vcd.SIGNALS):
+        self.dut = dut
+        self.period = period
+        self.period_ps = int(period * 1000)
+        self.events = set(events)
+        self.before = before
+        self.after = after
+        self.limit = limit
+        self.path = path
+        self.signals = [name for name in signals if hasattr(dut, name)]
+        self.handles = [getattr(dut, name) for name in self.signals]
+        # ring holds (time, signal index, value) changes since base, the
+        # values at time base_time
+        self.ring = collections.deque()
+        self.base = None
+        self.base_time = 0
+        self.phase = None
+        self.window = None
+        self.reason = None
+        self.closer = None
+        self.files = []
+
+    @classmethod
+    def from_env(cls, dut, period):
+        # PRBS_CAPTURE=error,sync,fail turns capture on for those events,
+        # PRBS_CAPTURE_WINDOW=before,after sets the window in clocks
+        events = os.environ.get("PRBS_CAPTURE")
+        if not events:
+            return None
+        before, after = (int(x) for x in os.environ.get("PRBS_CAPTURE_WINDOW", "1000,1000").split(","))
+        return cls(dut, period, events.split(","), before, after)
+
+    def start(self):
+        self.base = [h.value.binstr for h in self.handles]
+        self.base_time = get_sim_time("ps")
+        cocotb.start_soon(self.clock_phase())
+        for k, (name, handle) in enumerate(zip(self.signals, self.handles)):
+            if name != "clk":
+                cocotb.start_soon(self.sample(k, handle))
+        if "error" in self.events:
+            cocotb.start_soon(self.watch_errors())
+        if "sync" in self.events:
+            cocotb.start_soon(self.watch_sync())
+
+    async def clock_phase(self):
+        await RisingEdge(self.dut.clk)
+        self.phase = get_sim_time("ps") % self.period_ps
+
+    async def sample(self, k, handle):
+        edge = Edge(handle)
+        while True:
+            await edge
+            now = get_sim_time("ps")
+            self.ring.append((now, k, handle.value.binstr))
+            if self.window is None:
+                self.prune(now)
+
+    def prune(self, now):
+        # fold changes older than before clocks into base, keeping back to
+        # just ahead of a rising edge so the window opens with clk low and
+        # the changes made at that edge
+        oldest = now - self.before * self.period_ps
+        if self.phase is not None:
+            oldest -= (oldest - self.phase) % self.period_ps + 1
+        ring = self.ring
+        while ring and ring[0][0] < oldest:
+            time, k, value = ring.popleft()
+            self.base[k] = value
+        self.base_time = max(self.base_time, oldest)
+
+    async def watch_errors(self):
+        # error_count is all U until the monitor's first init, that is not
+        # an error
+        errors = self.dut.error_count
+
+        def counting():
+            value = errors.value
+            return value.is_resolvable and value.integer != 0
+
+        while True:
+            while not counting():
+                await Edge(errors)
+            self.trigger("error")
+            while counting():
+                await Edge(errors)
+
+    async def watch_sync(self):
+        # sync_now inside the monitor covers manual and auto syncs; fall back
+        # to any change of sync_manual if the simulator does not expose it
+        try:
+            sync = RisingEdge(self.dut.U_prbs_mon.sync_now)
+        except AttributeError:
+            sync = Edge(self.dut.sync_manual)
+        while True:
+            await sync
+            self.trigger("sync")
+
+    def trigger(self, reason):
+        # start a window unless one is already open or the limit is reached
+        if reason not in self.events or self.window is not None or len(self.files) >= self.limit:
+            return
+        now = get_sim_time("ps")
+        self.prune(now)
+        self.window = (self.base_time, list(self.base))
+        self.reason = reason
+        self.closer = cocotb.start_soon(self.close(now + self.after * self.period_ps))
+
+    async def close(self, end):
+        await Timer(end - get_sim_time("ps"), "ps")
+        self.closer = None
+        self.write(end)
+
+    def failed(self):
+        # the test is about to end: write what there is
+        self.trigger("fail")
+        if self.window is not None:
+            if self.closer is not None:
+                self.closer.kill()
+                self.closer = None
+            self.write(get_sim_time("ps"))
+
+    def write(self, end):
+        start, values = self.window
+        name = os.path.join(self.path, "capture_%d_%s.vcd" % (len(self.files), self.reason))
+        self.window = None
+
+        ids = {}
+        for k, sig in enumerate(self.signals):
+            ids[sig] = chr(33 + k)
+        clk = self.signals.index("clk") if "clk" in ids else None
+        period = self.period_ps
+        half = period // 2
+
+        # value changes in the window and, if clk is dumped, its edges drawn
+        # from the period and phase; a change at a rising edge then sits in
+        # the same timestamp as the edge, as the simulator would dump it
+        changes = [change for change in self.ring if change[0] <= end]
+        if clk is not None:
+            rise = start - (start - (start if self.phase is None else self.phase)) % period
+            values[clk] = "1" if start - rise < half else "0"
+            while rise <= end:
+                for time, value in ((rise, "1"), (rise + half, "0")):
+                    if start < time <= end:
+                        changes.append((time, clk, value))
+                rise += period
+            changes.sort(key=lambda change: change[0])
+
+        def dump(k, value):
+            if len(value) == 1:
+                f.write("%s%s\n" % (value.lower(), ids[self.signals[k]]))
+            else:
+                f.write("b%s %s\n" % (value.lower(), ids[self.signals[k]]))
+
+        with open(name, "w") as f:
+            f.write("$comment %s window $end\n$timescale 1ps $end\n" % self.reason)
+            f.write("$scope module prbs_tb $end\n")
+            for sig, handle in zip(self.signals, self.handles):
+                f.write("$var wire %d %s %s $end\n" % (len(handle), ids[sig], sig))
+            f.write("$upscope $end\n$enddefinitions $end\n")
+
+            f.write("#%d\n$dumpvars\n" % start)
+            for k, value in enumerate(values):
+                dump(k, value)
+            f.write("$end\n")
+            last = start
+            for time, k, value in changes:
+                if time != last:
+                    f.write("#%d\n" % time)
+                    last = time
+                dump(k, value)
+
+        self.files.append(name)
+        self.dut._log.info("Captured %d clocks around %s in %s", (end - start) // period, self.reason, name)
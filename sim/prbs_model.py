@@ -0,0 +1,386 @@
+
+import prbs31
+
+
+class prbs_mon:
+
+    # Software model of src/prbs_mon.vhd with DATA_W = 1.
+    #
+    # step() is clock accurate and takes every port. process() checks a whole
+    # numpy buffer of received bits at once, assuming data_in_valid is high on
+    # every clock and sync_manual/count_reset are left alone, and ends in the
+    # same state step() would. data_count/error_count are the counter
+    # registers, so like the HDL they trail the data by a clock. Set stats to
+    # a prbs_stats.ber_stats to stream it the position of every bit error.
+    # invert expects the O.150 inverted pattern (prbs31.prbs_poly.invert),
+    # received bits are inverted back before anything else sees them.
+
+    def __init__(self, initial_state, length, poly, sync_threshold=0, counter_w=32, toggle_control=True,
+                 invert=False):
+        self.initial_state = initial_state
+        self.len = length
+        self.poly = poly
+        self.invert = int(invert)
+        self.mask = 2**length-1
+        self.sync_threshold = sync_threshold
+        self.counter_mask = 2**counter_w-1
+        self.toggle_control = toggle_control
+        self.sync_manual = 0
+        self.count_reset = 0
+        self.syncs = 0
+        self.stats = None
+        self.init()
+
+    def init(self):
+        self.lfsr = self.initial_state
+        self.sync_bits = 0
+        self.sync_manual_d = 0
+        self.count_reset_d = 0
+        self.count_update = 0
+        self.errors = 0
+        self.error_count = 0
+        self.data_count = 0
+
+    def sync_now(self):
+        if self.toggle_control:
+            manual = self.sync_manual != self.sync_manual_d
+        else:
+            manual = self.sync_manual == 1
+        return manual or (self.sync_threshold > 0 and self.error_count > self.sync_threshold)
+
+    def count_reset_now(self):
+        if self.toggle_control:
+            return self.count_reset != self.count_reset_d
+        return self.count_reset == 1
+
+    def step(self, data_in, data_in_valid=1, init=0):
+        data_in ^= self.invert
+        sync_now = self.sync_now()
+        count_reset_now = self.count_reset_now()
+        sync_bits = self.sync_bits
+        count_update = self.count_update
+        errors = self.errors
+
+        self.sync_manual_d = self.sync_manual
+        self.count_reset_d = self.count_reset
+
+        if sync_now:
+            if sync_bits == 0:
+                self.syncs += 1
+            self.sync_bits = self.len - 1
+        else:
+            self.count_update = 0
+            if data_in_valid:
+                if sync_bits > 0:
+                    self.lfsr = ((self.lfsr << 1) | data_in) & self.mask
+                    self.sync_bits -= 1
+                else:
+                    newbit = prbs31.parity(self.lfsr & self.poly)
+                    self.lfsr = ((self.lfsr << 1) | newbit) & self.mask
+                    self.errors = data_in ^ newbit
+                    self.count_update = 1
+                    if self.stats is not None:
+                        self.stats.update([0] if self.errors else [], 1)
+
+        if sync_bits > 0 or count_reset_now:
+            self.error_count = 0
+            self.data_count = 0
+        elif count_update:
+            self.error_count = (self.error_count + errors) & self.counter_mask
+            self.data_count = (self.data_count + 1) & self.counter_mask
+
+        if init:
+            # count_update and errors are not reset by init in the RTL
+            self.lfsr = self.initial_state
+            self.sync_bits = 0
+            self.sync_manual_d = 0
+            self.count_reset_d = 0
+            self.error_count = 0
+            self.data_count = 0
+
+    def idle(self):
+        # True when no sync or count reset is pending, i.e. process() can run
+        # a block without per clock control
+        return not self.sync_now() and not self.count_reset_now() and self.sync_bits == 0
+
+    def process(self, bits, block=2**22):
+        np = prbs31.np
+        bits = np.asarray(bits, dtype=np.uint8)
+        pos = 0
+        size = 4096
+        while pos < len(bits):
+            if not self.idle():
+                self.step(int(bits[pos]))
+                pos += 1
+                size = 4096
+                continue
+
+            n = min(size, len(bits) - pos)
+            pos += self.track(bits[pos:pos + n])
+            size = min(size * 2, block)
+
+    def track(self, bits):
+        # Locked to the sequence: predict the block and compare. Returns the
+        # number of clocks consumed, see check_errors().
+        np = prbs31.np
+        predict, _ = prbs31.lfsr_generate(self.lfsr, self.poly, self.len, len(bits), packed=False)
+        if self.invert:
+            predict ^= 1
+        positions = np.flatnonzero(bits ^ predict)
+        n = self.check_errors(positions, len(bits))
+        self.lfsr = prbs31.lfsr_state_at(self.lfsr, self.poly, self.len, n)
+        return n
+
+    def check_errors(self, positions, n_bits):
+        # Count the next n_bits locked clocks given the sorted positions of
+        # the mispredicted bits among them, stopping early at the first clock
+        # where error_count passes sync_threshold. Returns the clocks consumed;
+        # the caller moves lfsr on by as many steps.
+        np = prbs31.np
+
+        # counter value seen by clock j >= 1, before its edge, is
+        # base + number of errors before clock j-1
+        base = self.error_count + (self.errors if self.count_update else 0)
+        n = n_bits
+        if self.sync_threshold > 0:
+            if base > self.sync_threshold:
+                n = 1
+            elif self.sync_threshold - base < len(positions):
+                n = min(int(positions[self.sync_threshold - base]) + 2, n_bits)
+
+        used = int(np.searchsorted(positions, n))
+        if self.stats is not None:
+            self.stats.update(positions[:used].tolist(), n)
+
+        last = used > 0 and int(positions[used - 1]) == n - 1
+        self.sync_manual_d = self.sync_manual
+        self.count_reset_d = self.count_reset
+        self.error_count = (base + used - last) & self.counter_mask
+        self.data_count = (self.data_count + self.count_update + n - 1) & self.counter_mask
+        self.errors = int(last)
+        self.count_update = 1
+        return n
+
+
+class prbs_mon_lanes:
+
+    # Several prbs_mon lanes, each with its own seed and possibly its own
+    # polynomial, checked together. process() takes a lanes x bits array.
+    # process_sliced() takes a bit sliced capture, one uint64 word per clock
+    # with lane j in bit j (see prbs31.slice_lanes()); lanes that share a
+    # polynomial and are locked are then predicted and compared together with
+    # one word operation per clock, and only lanes that need a sync are
+    # handled one at a time.
+    #
+    # Measured on PRBS31 over 2**22 clocks, 64 locked lanes through
+    # process_sliced() take 10 to 15x one lane through prbs_mon.process(),
+    # 5x less than 64 separate runs. That is short of 64 lanes for the price
+    # of one: a sliced word is 8 bytes a clock against 1 for a single lane,
+    # and blocks past 2**19 words fall out of cache.
+
+    def __init__(self, lanes):
+        self.lanes = list(lanes)
+
+    def process(self, bits):
+        for lane, row in zip(self.lanes, bits):
+            lane.process(row)
+
+    def process_sliced(self, words, block=2**19):
+        np = prbs31.np
+        words = np.asarray(words, dtype=np.uint64)
+        for pos in range(0, len(words), block):
+            self.sliced_block(words[pos:pos + block])
+
+    def sliced_block(self, words):
+        np = prbs31.np
+        n = len(words)
+        one = np.uint64(1)
+
+        groups = {}
+        for j, lane in enumerate(self.lanes):
+            if lane.idle():
+                groups.setdefault((lane.poly, lane.len), []).append(j)
+
+        predict = np.zeros(n, dtype=np.uint64)
+        idle_mask = 0
+        invert_mask = 0
+        final = {}
+        for (poly, length), members in groups.items():
+            states = [0] * (max(members) + 1)
+            for j in members:
+                states[j] = self.lanes[j].lfsr
+                idle_mask |= 1 << j
+                invert_mask |= self.lanes[j].invert << j
+            words_g, states = prbs31.lfsr_generate_sliced(states, poly, length, n)
+            predict ^= words_g
+            for j in members:
+                final[j] = states[j]
+
+        errors = (words ^ predict ^ np.uint64(invert_mask)) & np.uint64(idle_mask)
+        nz = np.flatnonzero(errors)
+        dense = len(nz) > n // 4
+        values = errors[nz]
+
+        for j, lane in enumerate(self.lanes):
+            if j in final and not dense:
+                positions = nz[((values >> np.uint64(j)) & one).astype(bool)]
+                start = lane.lfsr
+                m = lane.check_errors(positions, n)
+                if m == n:
+                    lane.lfsr = final[j]
+                    continue
+                lane.lfsr = prbs31.lfsr_state_at(start, lane.poly, lane.len, m)
+            else:
+                m = 0
+            lane.process(((words[m:] >> np.uint64(j)) & one).astype(np.uint8))
+
+    def data_count(self):
+        return [lane.data_count for lane in self.lanes]
+
+    def error_count(self):
+        return [lane.error_count for lane in self.lanes]
+
+    def synced(self):
+        return [lane.sync_bits == 0 for lane in self.lanes]
+
+    def syncs(self):
+        return [lane.syncs for lane in self.lanes]
+
+
+class prbs_gen:
+
+    # Software model of src/prbs_gen.vhd.
+    #
+    # step() is clock accurate. run() takes per clock numpy arrays and returns
+    # the whole data_out trace in one call, ending in the same state step()
+    # would. For DATA_W > 1 each data_req advances the register DATA_W steps
+    # (the step_word() order); the lfsr_proc loop in the RTL currently reads
+    # lfsr instead of v_lfsr and only advances one step, so the two only
+    # agree for DATA_W = 1 until that is fixed.
+
+    def __init__(self, initial_state, length, poly, data_w=1, toggle_control=True):
+        self.initial_state = initial_state
+        self.len = length
+        self.poly = poly
+        self.mask = 2**length-1
+        self.data_w = data_w
+        self.data_mask = 2**data_w-1
+        self.toggle_control = toggle_control
+        self.error_insert_d = 0
+        self.init()
+
+    def init(self):
+        self.lfsr = self.initial_state
+        self.error_arm = 0
+        self.data_out = 0
+
+    def trigger(self, error_insert, error_insert_d):
+        if self.toggle_control:
+            return error_insert != error_insert_d
+        return error_insert == 0 and error_insert_d == 1
+
+    def step(self, data_req, error_insert=0, error_mask=1, prbs_sel=1, data_in=0, init=0):
+        error_arm = self.error_arm
+        if self.trigger(error_insert, self.error_insert_d):
+            self.error_arm = 1
+        self.error_insert_d = error_insert
+
+        if data_req:
+            data = self.lfsr & self.data_mask if prbs_sel else data_in
+            if error_arm:
+                self.data_out = data ^ error_mask
+                self.error_arm = 0
+            else:
+                self.data_out = data
+            self.lfsr, _ = prbs31.lfsr_step_word(self.lfsr, self.poly, self.len, self.data_w)
+
+        if init:
+            self.init()
+        return self.data_out
+
+    def run(self, data_req, error_insert=None, error_mask=1, prbs_sel=1, data_in=None, init=None,
+            initial_state=None):
+        np = prbs31.np
+        data_req = np.asarray(data_req, dtype=bool)
+        n = len(data_req)
+        if error_insert is None:
+            error_insert = np.full(n, self.error_insert_d, dtype=np.uint8)
+        if data_in is None:
+            data_in = np.zeros(n, dtype=np.uint64)
+        error_insert = np.asarray(error_insert, dtype=np.uint8)
+        data_in = np.asarray(data_in, dtype=np.uint64)
+        prbs_sel = np.broadcast_to(np.asarray(prbs_sel, dtype=bool), (n,))
+        error_mask = np.broadcast_to(np.asarray(error_mask, dtype=np.uint64), (n,))
+
+        # init clocks go through step(), loading initial_state of that clock
+        # if given, the runs between them are vectorized
+        out = np.empty(n, dtype=np.uint64)
+        pos = 0
+        for c in ([] if init is None else np.flatnonzero(init)):
+            self.block(out, pos, c, data_req, error_insert, error_mask, prbs_sel, data_in)
+            if initial_state is not None:
+                self.initial_state = int(initial_state[c])
+            out[c] = self.step(data_req[c], int(error_insert[c]), int(error_mask[c]),
+                               prbs_sel[c], int(data_in[c]), init=1)
+            pos = c + 1
+        self.block(out, pos, n, data_req, error_insert, error_mask, prbs_sel, data_in)
+        return out
+
+    def block(self, out, lo, hi, data_req, error_insert, error_mask, prbs_sel, data_in):
+        np = prbs31.np
+        if lo >= hi:
+            return
+        req = data_req[lo:hi]
+        ins = error_insert[lo:hi]
+        n = hi - lo
+
+        # error_arm: set the clock after a trigger, consumed by the next
+        # data_req. A trigger on the clock that consumes it is lost.
+        ins_d = np.concatenate(([self.error_insert_d], ins[:-1]))
+        if self.toggle_control:
+            trig = np.flatnonzero(ins != ins_d)
+        else:
+            trig = np.flatnonzero((ins == 0) & (ins_d == 1))
+        reqs = np.flatnonzero(req)
+
+        flips = []
+        armed = 0 if self.error_arm else None
+        ti = 0
+        while True:
+            if armed is None:
+                if ti >= len(trig):
+                    break
+                armed = trig[ti] + 1
+            ri = np.searchsorted(reqs, armed)
+            if ri >= len(reqs):
+                break
+            flips.append(reqs[ri])
+            ti = np.searchsorted(trig, reqs[ri], side="right")
+            armed = None
+        self.error_arm = 0 if armed is None else 1
+        self.error_insert_d = int(ins[-1])
+
+        # prbs word presented at each data_req
+        words = np.empty(len(reqs), dtype=np.uint64)
+        if len(reqs):
+            w = self.data_w
+            words[0] = self.lfsr & self.data_mask
+            bits, self.lfsr = prbs31.lfsr_generate(self.lfsr, self.poly, self.len, len(reqs) * w, packed=False)
+            bits = bits[:(len(reqs) - 1) * w].reshape(-1, w).astype(np.uint64)
+            packed = np.zeros(len(bits), dtype=np.uint64)
+            for j in range(w):
+                packed = (packed << np.uint64(1)) | bits[:, j]
+            words[1:] = packed
+
+        data = np.where(prbs_sel[lo:hi][reqs], words, data_in[lo:hi][reqs])
+        flips = np.asarray(flips, dtype=np.int64)
+        data[np.searchsorted(reqs, flips)] ^= error_mask[lo:hi][flips]
+
+        # data_out holds between data_req clocks
+        last = np.maximum.accumulate(np.where(req, np.arange(n), -1))
+        values = np.concatenate(([self.data_out], data)).astype(np.uint64)
+        idx = np.zeros(n, dtype=np.int64)
+        idx[req] = np.arange(1, len(reqs) + 1)
+        out[lo:hi] = values[idx[np.maximum(last, 0)] * (last >= 0)]
+        if len(reqs):
+            self.data_out = int(data[-1])
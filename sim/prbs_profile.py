@@ -0,0 +1,169 @@
+
+import collections
+import logging
+import os
+import time
+
+import cocotb
+import cocotb.handle
+from cocotb.regression import RegressionManager
+from cocotb.task import Task
+
+
+log = logging.getLogger("cocotb.prbs_profile")
+
+
+def missing_internals():
+    # the private cocotb methods the profiler patches, checked by name
+    # since they can change in any release; cocotb 1.9 has them all
+    missing = ["%s.%s" % (cls.__name__, name)
+               for cls, name in ((Task, "_advance"), (RegressionManager, "_record_result"))
+               if not callable(getattr(cls, name, None))]
+    return missing
+
+
+class profiler:
+
+    # Opt-in profiling of the cocotb testbench. install() wraps the
+    # scheduler's Task._advance and the value property of the signal handle
+    # classes; nothing is wrapped until then, so a run without it pays
+    # nothing.
+    #
+    # Each resume of a coroutine is charged to the stack it resumes from,
+    # the chain of awaiting coroutines under the running test, e.g.
+    # loopback_test_fast_001;loopback_test;loopback.recover;loopback.clean;
+    # wait_count_clean. The second and third levels are the test phases.
+    # Signal reads and writes are charged to the same stack. write() gives a
+    # table and a folded stack file for flamegraph.pl or speedscope.
+
+    def __init__(self):
+        self.time = collections.Counter()
+        self.resumes = collections.Counter()
+        self.reads = collections.Counter()
+        self.writes = collections.Counter()
+        self.triggers = collections.Counter()
+        self.current = None
+        self.named = True
+
+    def install(self):
+        advance = Task._advance
+        prof = self
+
+        def profiled_advance(task, outcome):
+            stack = prof.stack(task)
+            outer = prof.current
+            prof.current = stack
+            start = time.perf_counter()
+            try:
+                trigger = advance(task, outcome)
+            finally:
+                prof.time[stack] += time.perf_counter() - start
+                prof.current = outer
+            prof.resumes[stack] += 1
+            if trigger is not None:
+                prof.triggers[type(trigger).__name__] += 1
+            return trigger
+
+        Task._advance = profiled_advance
+
+        # the handle classes only, cocotb.handle also imports BinaryValue
+        for cls in vars(cocotb.handle).values():
+            if (isinstance(cls, type) and cls.__module__ == cocotb.handle.__name__
+                    and isinstance(vars(cls).get("value"), property)):
+                cls.value = self.counted(vars(cls)["value"])
+
+    def counted(self, prop):
+        prof = self
+
+        def fget(handle):
+            prof.reads[prof.current] += 1
+            return prop.fget(handle)
+
+        def fset(handle, value):
+            prof.writes[prof.current] += 1
+            prop.fset(handle, value)
+
+        return property(fget, fset if prop.fset else None, prop.fdel, prop.__doc__)
+
+    def stack(self, task):
+        names = [self.test_name()]
+        obj = getattr(task, "_coro", None)
+        while obj is not None:
+            code = getattr(obj, "cr_code", None) or getattr(obj, "gi_code", None)
+            if code is None:
+                break
+            if code.co_name != "__await__":
+                names.append(getattr(code, "co_qualname", code.co_name))
+            obj = getattr(obj, "cr_await", None) if hasattr(obj, "cr_code") else getattr(obj, "gi_yieldfrom", None)
+        return ";".join(names)
+
+    def test_name(self):
+        # RegressionManager._test is private too: without it stacks start
+        # at "test" rather than the test name
+        manager = getattr(cocotb, "regression_manager", None)
+        if manager is None:
+            return "setup"
+        if not hasattr(manager, "_test"):
+            if self.named:
+                log.info("PRBS_PROFILE: cocotb %s has no RegressionManager._test, stacks are not split by test",
+                         cocotb.__version__)
+                self.named = False
+            return "test"
+        return getattr(manager._test, "__qualname__", "setup")
+
+    def phases(self, depth=3):
+        # time, resumes, reads and writes summed over the first depth levels
+        totals = collections.defaultdict(lambda: [0.0, 0, 0, 0])
+        for stack in set(self.time) | set(self.reads) | set(self.writes):
+            if stack is None:
+                continue
+            row = totals[";".join(stack.split(";")[:depth])]
+            row[0] += self.time[stack]
+            row[1] += self.resumes[stack]
+            row[2] += self.reads[stack]
+            row[3] += self.writes[stack]
+        return totals
+
+    def table(self):
+        lines = ["%10s %10s %10s %10s  %s" % ("ms", "resumes", "reads", "writes", "stack")]
+        for depth, title in ((3, "per test phase"), (None, "per coroutine stack")):
+            lines.append("-- %s" % title)
+            rows = self.phases(depth if depth else 10**6)
+            for stack, (seconds, resumes, reads, writes) in sorted(rows.items(), key=lambda r: -r[1][0]):
+                lines.append("%10.1f %10d %10d %10d  %s" % (1000 * seconds, resumes, reads, writes, stack))
+        lines.append("-- awaited triggers")
+        for name, count in self.triggers.most_common():
+            lines.append("%10d  %s" % (count, name))
+        return "\n".join(lines)
+
+    def write(self, prefix):
+        with open(prefix + ".txt", "w") as f:
+            f.write(self.table() + "\n")
+        # folded stacks, one "a;b;c microseconds" line each
+        with open(prefix + ".folded", "w") as f:
+            for stack, seconds in sorted(self.time.items()):
+                f.write("%s %d\n" % (stack, round(seconds * 1e6)))
+
+
+def from_env():
+    # PRBS_PROFILE=<prefix> profiles the run and rewrites <prefix>.txt and
+    # <prefix>.folded after every test, the simulator may not run atexit.
+    # Off, with a warning, on a cocotb without the internals it patches.
+    prefix = os.environ.get("PRBS_PROFILE")
+    if not prefix:
+        return None
+    missing = missing_internals()
+    if missing:
+        log.warning("PRBS_PROFILE ignored, cocotb %s lacks %s", cocotb.__version__, ", ".join(missing))
+        return None
+    prof = profiler()
+    prof.install()
+
+    record = RegressionManager._record_result
+
+    def record_and_write(manager, *args, **kwargs):
+        record(manager, *args, **kwargs)
+        prof.write(prefix)
+
+    RegressionManager._record_result = record_and_write
+    return prof
@@ -0,0 +1,130 @@
+
+import json
+import os
+import time
+
+import cocotb
+from cocotb.triggers import Timer
+from cocotb.utils import get_sim_time
+
+
+class progress:
+
+    # Progress of a long run from a background coroutine. It wakes on a
+    # simulation Timer sized from the last measured speed so that reports
+    # come about every interval wall seconds, and reads data_count there,
+    # so nothing runs at each clock and no count can be stepped over. Each
+    # report gives cycles/s, data bits/s and the ETA to the target count of
+    # the current phase. With out set it also appends the report as a JSON
+    # line there, for prbs_regress.py to follow.
+
+    def __init__(self, dut, period, interval=10.0, units="ns", out=None):
+        self.dut = dut
+        self.period = period
+        self.interval = interval
+        self.units = units
+        self.out = out
+        self.step = 1000 * period
+        self.task = None
+        self.phase(None)
+
+    @classmethod
+    def from_env(cls, dut, period):
+        # PRBS_PROGRESS=<seconds> between reports, 0 turns them off,
+        # PRBS_PROGRESS_OUT=<file> for the JSON lines
+        interval = float(os.environ.get("PRBS_PROGRESS", "10"))
+        if interval <= 0:
+            return None
+        return cls(dut, period, interval, out=os.environ.get("PRBS_PROGRESS_OUT"))
+
+    def phase(self, target, name=""):
+        # a new phase counts towards target from the data_count it is at now
+        self.target = target
+        self.name = name
+        self.last = None
+
+    def start(self):
+        if self.task is None:
+            self.task = cocotb.start_soon(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.kill()
+            self.task = None
+
+    def sample(self):
+        # None until data_count is resolved, it is all U before the first
+        # clock with init_mon
+        count = self.dut.data_count.value
+        if not count.is_resolvable:
+            return None
+        return time.perf_counter(), get_sim_time(self.units), count.integer
+
+    async def run(self):
+        wake = None
+        while True:
+            await Timer(self.step, self.units)
+            now = self.sample()
+            if now is None:
+                continue
+            if wake is not None and now[0] > wake[0]:
+                # aim the next Timer at interval wall seconds, growing by
+                # at most 10x while the steps are too short to time
+                step = min(self.step * self.interval / (now[0] - wake[0]), 10 * self.step)
+                self.step = max(round(step / self.period), 1) * self.period
+            wake = now
+            if self.last is None:
+                self.last = now
+            elif now[0] - self.last[0] >= self.interval / 2:
+                self.report(self.last, now)
+                self.last = now
+
+    def report(self, last, now):
+        wall = now[0] - last[0]
+        cycles_per_s = (now[1] - last[1]) / self.period / wall
+        count = now[2]
+        if count < last[2]:
+            # data_count was reset inside the window, count from the reset
+            bits_per_s = count / wall
+        else:
+            bits_per_s = (count - last[2]) / wall
+
+        eta = None
+        if self.target is not None and bits_per_s > 0:
+            eta = max(self.target - count, 0) / bits_per_s
+
+        record = {"phase": self.name, "sim_time": now[1], "data_count": count, "target": self.target,
+                  "cycles_per_s": cycles_per_s, "bits_per_s": bits_per_s, "eta_s": eta}
+        if self.target:
+            done = " of %d (%.1f%%)" % (self.target, 100 * min(count / self.target, 1))
+        else:
+            done = ""
+        self.dut._log.info("%s data_count %d%s, %.0f cycles/s, %.0f bits/s%s", self.name or "Progress", count,
+                           done, cycles_per_s, bits_per_s, "" if eta is None else ", ETA %s" % duration(eta))
+
+        if self.out:
+            with open(self.out, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def duration(seconds):
+    seconds = int(seconds)
+    if seconds < 3600:
+        return "%d:%02d" % divmod(seconds, 60)
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def latest(filename):
+    # last record of a PRBS_PROGRESS_OUT file, or None
+    try:
+        with open(filename) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for line in reversed(lines):
+        try:
+            return json.loads(line)
+        except ValueError:
+            # a line still being written
+            continue
+    return None
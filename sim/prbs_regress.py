@@ -0,0 +1,210 @@
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from multiprocessing import Pool, TimeoutError
+
+import cocotb
+from cocotb.runner import get_runner
+
+import prbs_progress
+
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(SIM_DIR, "..", "src")
+
+# the simulators import prbs_sim through the runner's PYTHONPATH
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+VHDL_SOURCES = [os.path.join(SRC, "prbs_gen.vhd"), os.path.join(SRC, "prbs_mon.vhd"),
+                os.path.join(SIM_DIR, "prbs_tb.vhd")]
+
+# generic sets run by default, each is built once
+GENERICS = [
+    {"DATA_W": 1, "TOGGLE_CONTROL": "true"},
+    {"DATA_W": 1, "TOGGLE_CONTROL": "false"},
+]
+
+
+def generics_name(generics):
+    return ",".join("%s=%s" % item for item in sorted(generics.items()))
+
+
+def generics_env(generics):
+    # what the Makefile exports for prbs_sim.py
+    env = {"PRBS_DATA_W": str(generics["DATA_W"]),
+           "PRBS_TOGGLE_CONTROL": str(generics["TOGGLE_CONTROL"]).lower()}
+    if "GENERATOR_W" in generics:
+        env["PRBS_GENERATOR_W"] = str(generics["GENERATOR_W"])
+    return env
+
+
+def build_dir(out, sim, generics):
+    tag = "_".join("%s" % value for _, value in sorted(generics.items()))
+    return os.path.join(out, "%s_%s" % (sim, tag))
+
+
+def build(sim, generics, out):
+    runner = get_runner(sim)
+    runner.build(vhdl_sources=VHDL_SOURCES, hdl_toplevel="prbs_tb",
+                 build_args=["--std=08"] if sim == "ghdl" else [], parameters=generics,
+                 build_dir=build_dir(out, sim, generics))
+
+
+def discover(patterns):
+    # test names from prbs_sim.py, they do not depend on the generics
+    import prbs_sim
+    names = sorted(name for name, obj in vars(prbs_sim).items() if isinstance(obj, cocotb.test))
+    return [name for name in names if any(fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+
+def test_dir(out, sim, generics, test):
+    return os.path.join(build_dir(out, sim, generics), test)
+
+
+def run_test(job):
+    # One simulator process for one test. Runs in a pool worker.
+    sim, generics, test, out = job
+    build = build_dir(out, sim, generics)
+    directory = test_dir(out, sim, generics, test)
+    os.makedirs(directory, exist_ok=True)
+    results = os.path.join(directory, "results.xml")
+    log = os.path.join(directory, "sim.log")
+    env = generics_env(generics)
+    env["PRBS_PROGRESS_OUT"] = os.path.join(directory, "progress.jsonl")
+
+    result = {"sim": sim, "generics": generics, "test": test, "passed": False,
+              "wall": 0.0, "sim_time_ns": None, "message": None, "log": log}
+    start = time.perf_counter()
+    try:
+        runner = get_runner(sim)
+        runner.test(test_module="prbs_sim", hdl_toplevel="prbs_tb", hdl_toplevel_lang="vhdl", testcase=test,
+                    parameters=generics, extra_env=env,
+                    build_dir=build, test_dir=directory, results_xml=results, log_file=log)
+    except (Exception, SystemExit) as e:
+        result["message"] = "%s: %s" % (type(e).__name__, e)
+    result["wall"] = time.perf_counter() - start
+
+    if os.path.exists(results):
+        for case in ET.parse(results).iter("testcase"):
+            if case.get("name") != test:
+                continue
+            result["sim_time_ns"] = float(case.get("sim_time_ns", 0))
+            failure = case.find("failure")
+            result["passed"] = failure is None and result["message"] is None
+            if failure is not None:
+                result["message"] = failure.get("message") or "failed"
+    elif result["message"] is None:
+        result["message"] = "no results, the simulator did not finish"
+    return result
+
+
+def junit(results, filename):
+    suites = ET.Element("testsuites")
+    groups = {}
+    for r in results:
+        groups.setdefault((r["sim"], generics_name(r["generics"])), []).append(r)
+
+    for (sim, name), group in sorted(groups.items()):
+        suite = ET.SubElement(suites, "testsuite", name="%s[%s]" % (sim, name),
+                              tests=str(len(group)),
+                              failures=str(sum(not r["passed"] for r in group)),
+                              time="%.3f" % sum(r["wall"] for r in group))
+        for r in group:
+            case = ET.SubElement(suite, "testcase", classname="prbs_sim", name=r["test"],
+                                 time="%.3f" % r["wall"])
+            if r["sim_time_ns"] is not None:
+                case.set("sim_time_ns", "%g" % r["sim_time_ns"])
+            if not r["passed"]:
+                ET.SubElement(case, "failure", message=r["message"] or "failed")
+    ET.ElementTree(suites).write(filename, encoding="utf-8", xml_declaration=True)
+
+
+def show_progress(jobs):
+    # the last progress record of each test that has written one
+    for sim, generics, test, out in jobs:
+        record = prbs_progress.latest(os.path.join(test_dir(out, sim, generics, test), "progress.jsonl"))
+        if record is None:
+            continue
+        eta = record["eta_s"]
+        print("  .. %-28s %-30s %-13s %12d bits/s%s" % (test, generics_name(generics), record["phase"],
+                                                        record["bits_per_s"],
+                                                        "" if eta is None else "  ETA " + prbs_progress.duration(eta)))
+
+
+def regress(sim, tests, generics=GENERICS, processes=None, out="sim_build", status=60):
+    out = os.path.abspath(out)
+    for g in generics:
+        build(sim, g, out)
+
+    # longest first so the pool does not wait on a soak test at the end
+    jobs = [(sim, g, test, out) for g in generics for test in tests]
+    jobs.sort(key=lambda job: "soak" not in job[2])
+    for sim, g, test, out in jobs:
+        progress = os.path.join(test_dir(out, sim, g, test), "progress.jsonl")
+        if os.path.exists(progress):
+            os.remove(progress)
+
+    # every status seconds without a result, show how the running tests are doing
+    results = []
+    pending = list(jobs)
+    with Pool(processes) as pool:
+        done = pool.imap_unordered(run_test, jobs)
+        while pending:
+            try:
+                r = done.next(timeout=status)
+            except TimeoutError:
+                show_progress(pending)
+                continue
+            pending = [job for job in pending if (job[1], job[2]) != (r["generics"], r["test"])]
+            print("%-4s %-28s %-30s %8.1f s" % ("PASS" if r["passed"] else "FAIL", r["test"],
+                                                generics_name(r["generics"]), r["wall"]))
+            results.append(r)
+    return results
+
+
+if __name__ == '__main__':
+    # python prbs_regress.py --sim nvc --tests 'loopback_test_fast_*' -j 8
+    parser = argparse.ArgumentParser(description="Run prbs_sim.py tests in parallel, one simulator per test")
+    parser.add_argument("--sim", default=os.environ.get("SIM", "nvc"), choices=("nvc", "ghdl"))
+    parser.add_argument("--tests", nargs="+", default=["*"], help="test name patterns")
+    parser.add_argument("--generics", action="append",
+                        help="a generic set, e.g. DATA_W=1,TOGGLE_CONTROL=true (repeatable)")
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument("--out", default="sim_build")
+    parser.add_argument("--junit", default="regress.xml")
+    parser.add_argument("--json", default="regress.json")
+    parser.add_argument("--status", type=float, default=60, help="seconds between progress reports")
+    args = parser.parse_args()
+
+    generics = GENERICS
+    if args.generics:
+        generics = []
+        for text in args.generics:
+            g = dict(item.split("=", 1) for item in text.split(","))
+            g["DATA_W"] = int(g.get("DATA_W", 1))
+            g.setdefault("TOGGLE_CONTROL", "true")
+            generics.append(g)
+
+    tests = discover(args.tests)
+    if not tests:
+        sys.exit("no tests match %s" % " ".join(args.tests))
+
+    start = time.perf_counter()
+    results = regress(args.sim, tests, generics, args.processes, args.out, args.status)
+    wall = time.perf_counter() - start
+
+    junit(results, args.junit)
+    with open(args.json, "w") as f:
+        json.dump({"sim": args.sim, "wall": wall, "results": results}, f, indent=1)
+
+    failed = [r for r in results if not r["passed"]]
+    busy = sum(r["wall"] for r in results)
+    print("%d tests, %d failed, %.1f s wall, %.1f s of simulation (%.1fx)"
+          % (len(results), len(failed), wall, busy, busy / wall if wall else 0))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,43 @@
+
+import prbs31
+
+
+class lfsr_scoreboard:
+
+    # Checks a DUT LFSR register against prbs31.lfsr_states(). run() samples
+    # the register once per trigger into a buffer and compares whole blocks
+    # with numpy, so the per sample cost is one read. It stops after steps
+    # samples, by default one period, where the register should be back at
+    # start.
+
+    def __init__(self, sig, start, poly, length, block=2**14):
+        self.sig = sig
+        self.start = start
+        self.poly = poly
+        self.len = length
+        self.block = block
+        self.state = start
+        self.count = 0
+
+    def check(self, samples):
+        np = prbs31.np
+        expect, self.state = prbs31.lfsr_states(self.state, self.poly, self.len, len(samples))
+        bad = np.flatnonzero(np.array(samples, dtype=np.uint64) != expect)
+        if len(bad):
+            k = int(bad[0])
+            raise AssertionError("LFSR mismatch at step %d: expected %#x, got %#x"
+                                 % (self.count + k + 1, int(expect[k]), samples[k]))
+        self.count += len(samples)
+
+    async def run(self, trigger, steps=None):
+        if steps is None:
+            steps = 2**self.len - 1
+        sig = self.sig
+        samples = []
+        while self.count + len(samples) < steps:
+            await trigger
+            samples.append(sig.value.integer)
+            if len(samples) == min(self.block, steps - self.count):
+                self.check(samples)
+                samples = []
+        return self.count
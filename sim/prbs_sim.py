@@ -1,1323 +1,337 @@
+import os
+
 import cocotb
-from cocotb.triggers import Timer, RisingEdge
+from cocotb.triggers import Timer, RisingEdge, ClockCycles
 from cocotb.clock    import Clock
 from cocotb.utils    import get_sim_time
+from cocotb.regression import TestFactory
 
 import prbs31
+import prbs_capture
+import prbs_profile
+import prbs_progress
+import prbs_scoreboard
+import prbs_wait
 
-@cocotb.test()
-async def prbs_mon_test(dut):
 
-	start = 0x7FFF0000
-	
-	lfsr = start
-	count = 0
-	
-	lfsr_length = 31
-	poly_bits = (30, 27)
-	
-	lfsr_mask = 2**lfsr_length-1
-	poly_mask = 0
-	    
-	for bit in poly_bits:
-	    poly_mask += 1 << bit
+# Generics of the build under test, exported by the Makefile
+DATA_W = int(os.environ.get("PRBS_DATA_W", "1"))
+TOGGLE_CONTROL = os.environ.get("PRBS_TOGGLE_CONTROL", "true").lower() == "true"
+GENERATOR_W = int(os.environ.get("PRBS_GENERATOR_W", "31"))
 
-	count_zeros = 0
-	count_ones = 0
+# clocks from the generator register reaching a state to data_count counting
+# the bit it sent, on top of the GENERATOR_W - 1 bits a sync spends loading;
+# measured on the models by test_prbs_model.py
+WRAP_LATENCY = 2
 
-	lfsr = prbs31.lfsr_example(start, poly_bits, lfsr_mask)
+CLK_PERIOD = 10
 
-	dut.init.value = 1
-	dut.initial_state.value = start
-	dut.polynomial.value = poly_mask
-	dut.error_insert.value = 0
-	dut.error_mask.value = 1	
-	dut.prbs_sel.value = 1
-	dut.data_in.value = 0		
-	dut.data_req.value = 0
+# PRBS_PROFILE=<prefix> turns on prbs_profile.py, unset it patches nothing
+PROFILE = prbs_profile.from_env()
 
-	print("Polynomial: ", hex(poly_mask))
+# steps prbs_mon_test checks at each end of the PRBS31 period
+SCOREBOARD_STEPS = 2**16
 
-	await cocotb.start(Clock(dut.clk, 10, units="ns").start())
+# data_req patterns, (clocks high, clocks per cycle)
+DATA_REQ = {
+	"continuous": (1, 1),
+	"half": (1, 2),
+	"half_slow": (2, 4),
+	"sparse": (1, 100),
+}
 
-	await Timer(1, "us")
-	await RisingEdge(dut.clk)
-	dut.init.value = 0
 
+async def data_req_pattern(dut, high, cycle):
+	# data_req high for the first high clocks of every cycle clocks, starting
+	# with this one
+	if high >= cycle:
+		dut.data_req.value = 1
+		return
+	high_time = ClockCycles(dut.clk, high)
+	low_time = ClockCycles(dut.clk, cycle - high)
 	while True:
-
-		count += 1
-
 		dut.data_req.value = 1
-
-		await RisingEdge(dut.clk)
-
+		await high_time
 		dut.data_req.value = 0
-
-		await RisingEdge(dut.clk)
-
-		lfsr.step()
-
-		assert lfsr.lfsr == dut.lfsr.value.integer, "LFSR Mismatch!"
-
-		if lfsr.lfsr == start:
-			dut._log.info("Simulation complete! LFSR Period: ", count)
+		await low_time
 
 
 @cocotb.test()
-async def prbs31_loopback_test1(dut):
+async def prbs_mon_test(dut):
 
 	start = 0x7FFF0000
 	
 	lfsr = start
 	count = 0
 	
-	lfsr_length = 31
-	poly_bits = (30, 27)
-	
-	lfsr_mask = 2**lfsr_length-1
-	poly_mask = 0
-	    
-	for bit in poly_bits:
-	    poly_mask += 1 << bit
-
-	count_zeros = 0
-	count_ones = 0
-
-	dut.init.value = 1
-	dut.initial_state.value = start
-	dut.polynomial.value = poly_mask
-	dut.error_insert.value = 0
-	dut.error_mask.value = 1	
-	dut.prbs_sel.value = 1
-	dut.data_in.value = 0		
-	dut.data_req.value = 0
-	dut.sync.value = 1
-	dut.count_reset.value = 1
-
-	print("Polynomial: ", hex(poly_mask))
-
-	await cocotb.start(Clock(dut.clk, 10, units="ns").start())
-
-	await Timer(1, "us")
-	await RisingEdge(dut.clk)
-	dut.init.value = 0
-	await RisingEdge(dut.clk)
-	dut.data_req.value = 1
-	dut.sync.value = 0
-	dut.count_reset.value = 0
-
-	dut._log.info("Simulation starting")
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break		
-	
-	dut._log.info("Simulating 1 clock sync")
-
-	dut.sync.value = 1
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-	dut._log.info("Simulating 10 us sync")
-	dut.sync.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 1 clock count reset")
-	dut.count_reset.value = 1
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 10 us count reset")
-	dut.count_reset.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
+	prbs = prbs31.PRBS["PRBS31"]
 
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
+	lfsr_length = prbs.length
+	poly_bits = prbs.poly_bits
 
-	dut._log.info("No errors for 10_000 values")
-	dut._log.info("Simulating for 1_000_000 values")
-
-	while dut.data_count.value.integer <= 1_000_000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 50_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-		if dut.data_count.value.integer == lfsr_mask:
-			dut._log.info("Simulation complete!")
-			break
-
-	dut._log.info("No errors. Simulation Complete!")
-
-
-@cocotb.test()
-async def prbs31_loopback_test2(dut):
-
-	start = 0x7FFF0000
-	
-	lfsr = start
-	count = 0
-	
-	lfsr_length = 31
-	poly_bits = (30, 27)
-	
-	lfsr_mask = 2**lfsr_length-1
-	poly_mask = 0
-	    
-	for bit in poly_bits:
-	    poly_mask += 1 << bit
+	lfsr_mask = prbs.mask
+	poly_mask = prbs.poly
 
 	count_zeros = 0
 	count_ones = 0
 
-	dut.init.value = 1
+	# the generator register inside prbs_tb, not every simulator exposes it
+	try:
+		register = dut.U_prbs_gen.lfsr
+	except AttributeError:
+		dut._log.info("Generator register not visible, not checking the LFSR")
+		return
+
+	scoreboard = prbs_scoreboard.lfsr_scoreboard(register, start, poly_mask, lfsr_length)
+
+	dut.init_gen.value = 1
+	dut.init_mon.value = 1
 	dut.initial_state.value = start
 	dut.polynomial.value = poly_mask
 	dut.error_insert.value = 0
 	dut.error_mask.value = 1	
 	dut.prbs_sel.value = 1
+	dut.data_in.value = 0		
 	dut.data_req.value = 0
-	dut.sync.value = 1
-	dut.count_reset.value = 1
 
 	print("Polynomial: ", hex(poly_mask))
 
-	await cocotb.start(Clock(dut.clk, 10, units="ns").start())
-	await cocotb.start(Clock(dut.data_req, 20, units="ns").start())
+	await cocotb.start(Clock(dut.clk, CLK_PERIOD, units="ns").start())
 
 	await Timer(1, "us")
 	await RisingEdge(dut.clk)
-	dut.init.value = 0
-	await RisingEdge(dut.clk)
-	dut.data_req.value = 1
-	dut.sync.value = 0
-	dut.count_reset.value = 0
-
-	dut._log.info("Simulation starting")
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break		
-	
-	dut._log.info("Simulating 1 clock sync")
-
-	dut.sync.value = 1
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-	dut._log.info("Simulating 10 us sync")
-	dut.sync.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 1 clock count reset")
-	dut.count_reset.value = 1
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
+	dut.init_gen.value = 0
+	dut.init_mon.value = 0
 
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
+	# the first and last SCOREBOARD_STEPS steps of the period, the middle
+	# is jumped over by loading the generator with lfsr_state_at() rather
+	# than walked one clock at a time
+	pattern = await cocotb.start(data_req_pattern(dut, *DATA_REQ["half"]))
+	count = await scoreboard.run(ClockCycles(dut.clk, 2), SCOREBOARD_STEPS)
 
-	dut._log.info("Simulating 10 us count reset")
-	dut.count_reset.value = 1
-	await Timer(10, "us")
+	pattern.kill()
+	dut.data_req.value = 0
+	tail = prbs31.lfsr_state_at(start, poly_mask, lfsr_length, lfsr_mask - SCOREBOARD_STEPS)
+	dut._log.info("Jumping to %#x, %d steps before the end of the period", tail, SCOREBOARD_STEPS)
+	dut.initial_state.value = tail
+	dut.init_gen.value = 1
 	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-	dut._log.info("Simulating for 1_000_000 values")
-
-	while dut.data_count.value.integer <= 1_000_000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 50_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
+	dut.init_gen.value = 0
 
-		if dut.data_count.value.integer == lfsr_mask:
-			dut._log.info("Simulation complete!")
-			break
+	scoreboard = prbs_scoreboard.lfsr_scoreboard(register, tail, poly_mask, lfsr_length)
+	await cocotb.start(data_req_pattern(dut, *DATA_REQ["half"]))
+	count += await scoreboard.run(ClockCycles(dut.clk, 2), SCOREBOARD_STEPS)
+
+	assert register.value.integer & lfsr_mask == start, "LFSR not back at start after a period"
+
+	dut._log.info("Simulation complete! LFSR Period: %d (%d steps checked)", lfsr_mask, count)
+
+
+class loopback:
+
+	# prbs_tb with the generator looped back into the monitor. control()
+	# gives one sync, count reset or error insert: a toggle of the port with
+	# TOGGLE_CONTROL, otherwise a pulse held for the given number of clocks.
+	# The long waits report progress through prbs_progress.py.
+
+	def __init__(self, dut, prbs, start, sync_threshold, toggle_control):
+		self.dut = dut
+		self.prbs = prbs
+		self.start = start
+		self.sync_threshold = sync_threshold
+		self.toggle_control = toggle_control
+		self.progress = prbs_progress.progress.from_env(dut, CLK_PERIOD)
+
+	def phase(self, name, target):
+		if self.progress:
+			self.progress.phase(target, name)
+
+	async def control(self, sig, clocks=1):
+		dut = self.dut
+		if self.toggle_control:
+			sig.value = 1 - sig.value.integer
+			await RisingEdge(dut.clk)
+		else:
+			sig.value = 1
+			await prbs_wait.clock_cycles(dut.clk, clocks, CLK_PERIOD)
+			sig.value = 0
+
+	async def reset(self, data_req):
+		dut = self.dut
+
+		dut.init_gen.value = 1
+		dut.init_mon.value = 1
+		dut.initial_state.value = self.start
+		dut.polynomial.value = self.prbs.poly
+		dut.error_insert.value = 0
+		dut.error_mask.value = 1
+		dut.prbs_sel.value = 1
+		dut.data_in.value = 0
+		dut.data_req.value = 0
+		dut.count_reset.value = 0
+		dut.sync_manual.value = 0
+		dut.sync_threshold.value = self.sync_threshold
+
+		print("Polynomial: ", hex(self.prbs.poly))
+
+		await cocotb.start(Clock(dut.clk, CLK_PERIOD, units="ns").start())
+		if self.progress:
+			self.progress.start()
+
+		await Timer(1, "us")
+		await RisingEdge(dut.clk)
+		dut.init_gen.value = 0
+		await RisingEdge(dut.clk)
+		await cocotb.start(data_req_pattern(dut, *DATA_REQ[data_req]))
+
+		if self.sync_threshold == 0:
+			await self.restart_monitor()
+			return
+
+		# the monitor comes out of init late, out of step with the
+		# generator, and has to find the sequence through auto sync
+		await Timer(1, "us")
+		await RisingEdge(dut.clk)
+		dut.init_mon.value = 0
+
+		dut._log.info("Waiting for auto sync")
+
+		await prbs_wait.wait_error_change(dut.clk, dut.error_count)
+		await prbs_wait.wait_value(dut.clk, dut.error_count, lambda v: v == 0)
+		await prbs_wait.wait_value(dut.clk, dut.data_count, lambda v: v > 0)
+
+		assert dut.error_count.value == 0, "Auto sync failure"
+
+		dut._log.info("Auto sync complete")
+
+	async def restart_monitor(self, generator=False):
+		# init with sync_manual high over the release. Held for a clock that
+		# is a sync; in toggle mode it is one too, init clears sync_manual_d.
+		dut = self.dut
+		dut.init_mon.value = 1
+		dut.init_gen.value = int(generator)
+		dut.sync_manual.value = 1
+		await RisingEdge(dut.clk)
+		dut.init_mon.value = 0
+		dut.init_gen.value = 0
+		await RisingEdge(dut.clk)
+		if not self.toggle_control:
+			dut.sync_manual.value = 0
+
+	async def clean(self, values):
+		dut = self.dut
+		self.phase("Clean", values + 1)
+		await prbs_wait.wait_count_clean(dut.clk, dut.data_count, values + 1, dut.error_count, CLK_PERIOD, step=DATA_W)
+		dut._log.info("No errors for %d values", values)
+
+	async def insert_error(self, clocks=1):
+		dut = self.dut
+		dut._log.info("Inserting bit error")
+		await self.control(dut.error_insert, clocks)
+		await prbs_wait.wait_error_change(dut.clk, dut.error_count)
+		dut._log.info("Error detected")
+
+	async def recover(self, values):
+		# an error cleared by each of a short and a long sync and count reset
+		dut = self.dut
+		for sig in (dut.sync_manual, dut.count_reset):
+			for clocks in (1, 1000):
+				await self.insert_error(clocks)
+				dut._log.info("Simulating %d clock %s", clocks, sig._name)
+				await self.control(sig, clocks)
+				await prbs_wait.wait_value(dut.clk, dut.error_count, lambda v: v == 0)
+				await self.clean(values)
+
+	async def run_out(self, values):
+		# restart the monitor and run values more, up to a full period
+		dut = self.dut
+		values = min(values, self.prbs.mask)
+		dut._log.info("Simulating for %d values", values)
+
+		await self.restart_monitor()
+
+		self.phase("Run out", values)
+		await prbs_wait.wait_count_clean(dut.clk, dut.data_count, values, dut.error_count, CLK_PERIOD, step=DATA_W)
+		if values == self.prbs.mask:
+			dut._log.info("LFSR rollover occured.")
+
+	async def run_over_wrap(self, before, after):
+		# Fast forward to the period boundary: load both ends with the state
+		# before steps short of coming back round to start, then run across
+		# it. data_count restarts at the load, so at the wrap it is before
+		# less the GENERATOR_W - 1 bits spent syncing and WRAP_LATENCY,
+		# rather than a full period, or 0 if it wraps before that.
+		dut = self.dut
+		prbs = self.prbs
+		state = prbs31.lfsr_state_at(self.start, prbs.poly, prbs.length, prbs.mask - before)
+		dut._log.info("Loading %#x, %d steps before the wrap", state, before)
+
+		dut.initial_state.value = state
+		await self.restart_monitor(generator=True)
+		dut.initial_state.value = self.start
+
+		try:
+			wrap = cocotb.start_soon(self.wrap_count(dut.U_prbs_gen.lfsr))
+		except AttributeError:
+			wrap = None
+			dut._log.info("Generator register not visible, not checking where it wraps")
+
+		self.phase("Over the wrap", before + after)
+		await prbs_wait.wait_count_clean(dut.clk, dut.data_count, before + after, dut.error_count, CLK_PERIOD, step=DATA_W)
+
+		if wrap is not None:
+			assert wrap.done(), "Generator did not wrap"
+			count = wrap.result()
+			gap = min(before, GENERATOR_W - 1 + WRAP_LATENCY)
+			assert min(before, GENERATOR_W - 1) <= before - count <= gap, \
+				"Wrapped at data_count %d, %d steps after the load, expected %d" % (count, before, before - gap)
+			dut._log.info("LFSR rollover at data_count %d, %d of a full period", count, count + prbs.mask - before)
+
+	async def wrap_count(self, lfsr):
+		# data_count when the generator register is back at start
+		mask = self.prbs.mask
+		await prbs_wait.wait_value(self.dut.clk, lfsr, lambda v: v & mask == self.start)
+		return self.dut.data_count.value.integer
+
+
+async def loopback_test(dut, prbs, start, sync_threshold, data_req, values, final_values):
+	tb = loopback(dut, prbs31.PRBS[prbs], start, sync_threshold, TOGGLE_CONTROL)
+
+	capture = prbs_capture.wave_capture.from_env(dut, CLK_PERIOD)
+	if capture:
+		capture.start()
+
+	try:
+		await tb.reset(data_req)
+
+		dut._log.info("Simulation starting")
+
+		await tb.clean(values)
+		await tb.recover(values)
+		if final_values is None:
+			# across the boundary clean, then with the sync straddling it
+			await tb.run_over_wrap(4096, 1024)
+			await tb.run_over_wrap(tb.prbs.length, 1024)
+		else:
+			await tb.run_out(final_values)
+	except BaseException:
+		# failed asserts, timeouts and the test being killed alike
+		if capture:
+			capture.failed()
+		raise
 
 	dut._log.info("No errors. Simulation Complete!")
 
 
-@cocotb.test()
-async def prbs31_loopback_test1(dut):
-
-	start = 0x7FFF0000
-	
-	lfsr = start
-	count = 0
-	
-	lfsr_length = 31
-	poly_bits = (30, 27)
-	
-	lfsr_mask = 2**lfsr_length-1
-	poly_mask = 0
-	    
-	for bit in poly_bits:
-	    poly_mask += 1 << bit
-
-	count_zeros = 0
-	count_ones = 0
-
-	dut.init.value = 1
-	dut.initial_state.value = start
-	dut.polynomial.value = poly_mask
-	dut.error_insert.value = 0
-	dut.error_mask.value = 1	
-	dut.prbs_sel.value = 1
-	dut.data_in.value = 0		
-	dut.data_req.value = 0
-	dut.sync.value = 1
-	dut.count_reset.value = 1
-
-	print("Polynomial: ", hex(poly_mask))
-
-	await cocotb.start(Clock(dut.clk, 10, units="ns").start())
-
-	await Timer(1, "us")
-	await RisingEdge(dut.clk)
-	dut.init.value = 0
-	await RisingEdge(dut.clk)
-	dut.data_req.value = 1
-	dut.sync.value = 0
-	dut.count_reset.value = 0
-
-	dut._log.info("Simulation starting")
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break		
-	
-	dut._log.info("Simulating 1 clock sync")
-
-	dut.sync.value = 1
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-	dut._log.info("Simulating 10 us sync")
-	dut.sync.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 1 clock count reset")
-	dut.count_reset.value = 1
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 10 us count reset")
-	dut.count_reset.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-	dut._log.info("Simulating for 1_000_000 values")
-
-	while dut.data_count.value.integer <= 1_000_000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 50_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-		if dut.data_count.value.integer == lfsr_mask:
-			dut._log.info("Simulation complete!")
-			break
-
-	dut._log.info("No errors. Simulation Complete!")
-
-
-@cocotb.test()
-async def prbs13_loopback_test1(dut):
-
-	start = 0x2
-	
-	lfsr = start
-	count = 0
-	
-	lfsr_length = 13
-	poly_bits = (12, 11, 1, 0)
-	
-	lfsr_mask = 2**lfsr_length-1
-	poly_mask = 0
-	    
-	for bit in poly_bits:
-	    poly_mask += 1 << bit
-
-	count_zeros = 0
-	count_ones = 0
-
-	dut.init.value = 1
-	dut.initial_state.value = start
-	dut.polynomial.value = poly_mask
-	dut.error_insert.value = 0
-	dut.error_mask.value = 1	
-	dut.prbs_sel.value = 1
-	dut.data_req.value = 0
-	dut.sync.value = 1
-	dut.count_reset.value = 1
-
-	print("Polynomial: ", hex(poly_mask))
-
-	await cocotb.start(Clock(dut.clk, 10, units="ns").start())
-	await cocotb.start(Clock(dut.data_req, 40, units="ns").start())
-
-	await Timer(1, "us")
-	await RisingEdge(dut.clk)
-	dut.init.value = 0
-	await RisingEdge(dut.clk)
-	dut.data_req.value = 1
-	dut.sync.value = 0
-	dut.count_reset.value = 0
-
-	dut._log.info("Simulation starting")
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break		
-	
-	dut._log.info("Simulating 1 clock sync")
-
-	dut.sync.value = 1
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-	dut._log.info("Simulating 10 us sync")
-	dut.sync.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 1 clock count reset")
-	dut.count_reset.value = 1
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 10 us count reset")
-	dut.count_reset.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-	dut._log.info("Simulating for 1_000_000 values")
-
-	print("Expected count length: ", lfsr_mask)
-
-	dut.init.value = 1
-	dut.sync.value = 1
-	await RisingEdge(dut.clk)
-	dut.init.value = 0
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 50_0000) == 0 and \
-			dut.data_count.value.integer != count and \
-			dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-			count = dut.data_count.value.integer
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-		if dut.data_count.value.integer == lfsr_mask:
-			dut._log.info("Simulation complete! LFSR rollover occured.")
-			break
-
-	dut._log.info("No errors. Simulation Complete!")
-
-async def custom_clock(dut):
-    # pre-construct triggers for performance
-    high_time = Timer(10, units="ns")
-    low_time = Timer(990, units="ns")
-    await Timer(0, units="ns")
-    while True:
-        dut.data_req.value = 1
-        await high_time
-        dut.data_req.value = 0
-        await low_time
-
-@cocotb.test()
-async def prbs13_loopback_test2(dut):
-
-	start = 0x2
-	
-	lfsr = start
-	count = 0
-	
-	lfsr_length = 13
-	poly_bits = (12, 11, 1, 0)
-	
-	lfsr_mask = 2**lfsr_length-1
-	poly_mask = 0
-	    
-	for bit in poly_bits:
-	    poly_mask += 1 << bit
-
-	count_zeros = 0
-	count_ones = 0
-
-	dut.init.value = 1
-	dut.initial_state.value = start
-	dut.polynomial.value = poly_mask
-	dut.error_insert.value = 0
-	dut.error_mask.value = 1	
-	dut.prbs_sel.value = 1
-	dut.data_req.value = 0
-	dut.sync.value = 1
-	dut.count_reset.value = 1
-
-	print("Polynomial: ", hex(poly_mask))
-
-	await cocotb.start(Clock(dut.clk, 10, units="ns").start())
-	await cocotb.start(custom_clock(dut))
-
-	await Timer(1, "us")
-	await RisingEdge(dut.clk)
-	dut.init.value = 0
-	await RisingEdge(dut.clk)
-	dut.data_req.value = 1
-	dut.sync.value = 0
-	dut.count_reset.value = 0
-
-	dut._log.info("Simulation starting")
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break		
-	
-	dut._log.info("Simulating 1 clock sync")
-
-	dut.sync.value = 1
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-	dut._log.info("Simulating 100 us sync")
-	dut.sync.value = 1
-	await Timer(100, "us")
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 1 clock count reset")
-	dut.count_reset.value = 1
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-	await Timer(10, "us")
-	await RisingEdge(dut.clk)
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 100 us count reset")
-	dut.count_reset.value = 1
-	await Timer(100, "us")
-	await RisingEdge(dut.clk)
-	dut.count_reset.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-	dut._log.info("Simulating for 1_000_000 values")
-
-	print("Expected count length: ", lfsr_mask)
-
-	dut.init.value = 1
-	dut.sync.value = 1
-	await RisingEdge(dut.clk)
-	dut.init.value = 0
-	await RisingEdge(dut.clk)
-	dut.sync.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 50_0000) == 0 and \
-			dut.data_count.value.integer != count and \
-			dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-			count = dut.data_count.value.integer
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-		if dut.data_count.value.integer == lfsr_mask:
-			dut._log.info("Simulation complete! LFSR rollover occured.")
-			break
-
-	dut._log.info("No errors. Simulation Complete!")
-
-
-@cocotb.test()
-async def prbs13_loopback_test3(dut):
-
-	# Test for sync, autosync, and error insertion using bit toggle
-
-	start = 0x2
-	
-	lfsr = start
-	count = 0
-	
-	lfsr_length = 13
-	poly_bits = (12, 11, 1, 0)
-	
-	lfsr_mask = 2**lfsr_length-1
-	poly_mask = 0
-	    
-	for bit in poly_bits:
-	    poly_mask += 1 << bit
-
-	count_zeros = 0
-	count_ones = 0
-
-	dut.init_gen.value = 1
-	dut.init_mon.value = 1
-	dut.initial_state.value = start
-	dut.polynomial.value = poly_mask
-	dut.error_insert.value = 0
-	dut.error_mask.value = 1	
-	dut.prbs_sel.value = 1
-	dut.data_req.value = 0
-	dut.count_reset.value = 0
-	dut.sync_manual.value = 0
-	dut.sync_threshold.value = 50
-
-	print("Polynomial: ", hex(poly_mask))
-
-	await cocotb.start(Clock(dut.clk, 10, units="ns").start())
-
-	await Timer(1, "us")
-	await RisingEdge(dut.clk)
-	dut.init_gen.value = 0
-	await RisingEdge(dut.clk)
-	dut.data_req.value = 1
-	dut.sync_manual.value = 0
-	dut.count_reset.value = 0
-	await Timer(1, "us")
-	await RisingEdge(dut.clk)
-	dut.init_mon.value = 0
-
-	dut._log.info("Simulation starting")
-
-	dut._log.info("Waiting for auto sync")
-
-	while dut.error_count.value.integer == 0:
-		await RisingEdge(dut.clk)
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer == 0:
-		await RisingEdge(dut.clk)
-
-	assert dut.error_count.value == 0, "Auto sync failure"
-
-	dut._log.info("Auto sync complete")
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break		
-	
-	dut._log.info("Simulating sync")
-
-	dut.sync_manual.value = 1
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", hex(dut.data_count.value.integer))
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-	dut._log.info("Simulating 100 us sync")
-	dut.sync_manual.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 1
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 1 clock count reset")
-	dut.count_reset.value = 1
-
-	while dut.error_count.value.integer > 0:
-		await RisingEdge(dut.clk)
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-
-	dut._log.info("Inserting bit error")
-	dut.error_insert.value = 0
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if dut.error_count.value.integer > 0:
-			dut._log.info("Error detected")
-			break
-	
-
-	dut._log.info("Simulating 100 us count reset")
-	dut.count_reset.value = 0
-
-	while dut.data_count.value.integer <= 10000:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 0x100_0000) == 0 and dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-	dut._log.info("No errors for 10_000 values")
-	dut._log.info("Simulating for 1_000_000 values")
-
-	print("Expected count length: ", lfsr_mask)
-
-	dut.init_mon.value = 1
-	await RisingEdge(dut.clk)
-	dut.init_mon.value = 0
-	await RisingEdge(dut.clk)
-	dut.sync_manual.value = 1
-
-	while True:
-
-		await RisingEdge(dut.clk)
-
-		if (dut.data_count.value.integer % 50_0000) == 0 and \
-			dut.data_count.value.integer != count and \
-			dut.data_count.value.integer > 0:
-			print("Count: ", dut.data_count.value.integer)
-			count = dut.data_count.value.integer
-
-		assert dut.error_count.value.integer == 0, "Unexpected error!"
-
-		if dut.data_count.value.integer == lfsr_mask:
-			dut._log.info("Simulation complete! LFSR rollover occured.")
-			break
-
-	dut._log.info("No errors. Simulation Complete!")
\ No newline at end of file
+# loopback_test_fast_NNN, loopback_test_soak_NNN and loopback_test_wrap_NNN
+# run every combination of the options below, the generated docstring lists
+# them. Soak 001/002 are the old prbs31_loopback_test1/2 and 013 is the old
+# prbs13_loopback_test3. The wrap tests fast forward to the period boundary
+# instead of running a whole period. The generics are not an option: a run
+# covers the one build the Makefile made, prbs_regress.py runs each set.
+for postfix, values, final_values in (("_fast", 1_000, 8191), ("_soak", 10_000, 1_000_000), ("_wrap", 1_000, None)):
+	factory = TestFactory(loopback_test, values=values, final_values=final_values)
+	factory.add_option(("prbs", "start"), [("PRBS31", 0x7FFF0000), ("PRBS13", 0x2)])
+	factory.add_option("sync_threshold", [0, 50])
+	factory.add_option("data_req", list(DATA_REQ))
+	factory.generate_tests(postfix=postfix)
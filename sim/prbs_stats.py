@@ -0,0 +1,164 @@
+
+import math
+
+
+def poisson_interval(errors, bits, confidence=0.95):
+    # Two sided confidence bounds on the BER, treating the error count as
+    # Poisson. Large counts use the normal approximation.
+    if bits == 0:
+        return 0.0, 1.0
+    alpha = (1 - confidence) / 2
+
+    if errors > 1000:
+        z = math.sqrt(2) * erfinv(1 - 2 * alpha)
+        half = z * math.sqrt(errors)
+        return max(errors - half, 0) / bits, (errors + half) / bits
+
+    def cdf(k, lam):
+        # P(X <= k)
+        if lam == 0:
+            return 1.0
+        return sum(math.exp(-lam + i * math.log(lam) - math.lgamma(i + 1)) for i in range(k + 1))
+
+    def solve(target, k):
+        # lam with cdf(k, lam) = target, cdf falls as lam grows
+        lo, hi = 0.0, errors + 10 * math.sqrt(errors + 1) + 10
+        for _ in range(100):
+            mid = (lo + hi) / 2
+            if cdf(k, mid) > target:
+                lo = mid
+            else:
+                hi = mid
+        return (lo + hi) / 2
+
+    low = 0.0 if errors == 0 else solve(1 - alpha, errors - 1)
+    high = solve(alpha, errors)
+    return low / bits, high / bits
+
+
+def erfinv(y):
+    # Newton iterations on math.erf
+    x = 0.0
+    for _ in range(50):
+        x -= (math.erf(x) - y) / (2 / math.sqrt(math.pi) * math.exp(-x * x))
+    return x
+
+
+class ber_stats:
+
+    # Streaming BER statistics over error positions. Feed it chunks with
+    # update(positions, n_bits), positions relative to the start of the chunk
+    # and sorted. Memory use does not grow with the number of bits or errors:
+    # the sliding window is a ring of per bucket error counts and both
+    # histograms are bounded.
+    #
+    # A burst is a run of errors each at most burst_gap bits after the last.
+    # burst_hist counts bursts by number of errors (the last bucket collects
+    # anything longer), error_free_hist counts error free intervals by
+    # floor(log2(length + 1)).
+
+    def __init__(self, window=10**6, buckets=100, burst_gap=32, max_burst=64, confidence=0.95):
+        self.bucket_bits = max(window // buckets, 1)
+        self.buckets = buckets
+        self.burst_gap = burst_gap
+        self.max_burst = max_burst
+        self.confidence = confidence
+
+        self.bits = 0
+        self.errors = 0
+
+        self.ring = [0] * buckets
+        self.bucket = 0
+        self.window_errors = 0
+        self.max_window_ber = 0.0
+
+        self.last_error = None
+        self.burst = 0
+        self.bursts = 0
+        self.burst_hist = [0] * (max_burst + 1)
+        self.error_free_hist = [0] * 65
+        self.longest_error_free = 0
+
+    def advance(self, bucket):
+        # close buckets up to (not including) bucket
+        if bucket - self.bucket >= self.buckets:
+            self.advance(self.bucket + 1)
+            self.ring = [0] * self.buckets
+            self.window_errors = 0
+            self.bucket = bucket
+            return
+        while self.bucket < bucket:
+            if self.bucket >= self.buckets - 1:
+                ber = self.window_errors / (self.buckets * self.bucket_bits)
+                self.max_window_ber = max(self.max_window_ber, ber)
+            self.bucket += 1
+            slot = self.bucket % self.buckets
+            self.window_errors -= self.ring[slot]
+            self.ring[slot] = 0
+
+    def interval(self, length):
+        self.error_free_hist[min(int(length + 1).bit_length() - 1, 64)] += 1
+        self.longest_error_free = max(self.longest_error_free, length)
+
+    def close_burst(self):
+        if self.burst:
+            self.burst_hist[min(self.burst, self.max_burst)] += 1
+            self.bursts += 1
+            self.burst = 0
+
+    def update(self, positions, n_bits):
+        base = self.bits
+        for pos in positions:
+            pos = base + int(pos)
+            self.advance(pos // self.bucket_bits)
+            self.ring[self.bucket % self.buckets] += 1
+            self.window_errors += 1
+
+            if self.last_error is None:
+                self.interval(pos)
+                self.burst = 1
+            elif pos - self.last_error <= self.burst_gap:
+                self.burst += 1
+            else:
+                self.interval(pos - self.last_error - 1)
+                self.close_burst()
+                self.burst = 1
+            self.last_error = pos
+            self.errors += 1
+
+        self.bits += n_bits
+        self.advance(self.bits // self.bucket_bits)
+
+    def update_errors(self, errors):
+        # errors is a numpy array with one entry per checked bit, non zero
+        # where the bit was wrong
+        import numpy as np
+        self.update(np.flatnonzero(errors).tolist(), len(errors))
+
+    def window_ber(self):
+        # the current bucket plus the buckets-1 closed ones before it
+        bits = min(self.bits, (self.buckets - 1) * self.bucket_bits + self.bits % self.bucket_bits)
+        if bits == 0:
+            return 0.0
+        return self.window_errors / bits
+
+    def summary(self):
+        low, high = poisson_interval(self.errors, self.bits, self.confidence)
+        # the running burst and error free stretch are still open
+        burst_hist = list(self.burst_hist)
+        if self.burst:
+            burst_hist[min(self.burst, self.max_burst)] += 1
+        tail = self.bits if self.last_error is None else self.bits - self.last_error - 1
+        return {
+            "bits": self.bits,
+            "errors": self.errors,
+            "ber": self.errors / self.bits if self.bits else 0.0,
+            "ber_low": low,
+            "ber_high": high,
+            "window_ber": self.window_ber(),
+            "max_window_ber": self.max_window_ber,
+            "longest_error_free": max(self.longest_error_free, tail),
+            "error_free_hist": self.error_free_hist,
+            "bursts": self.bursts + (1 if self.burst else 0),
+            "burst_hist": burst_hist,
+        }
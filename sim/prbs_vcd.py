@@ -0,0 +1,192 @@
+
+import argparse
+import os
+import sys
+
+import prbs31
+import prbs_model
+
+
+class vcd_reader:
+
+    # Streaming VCD reader. Only the header and the current value of the
+    # tracked signals are held in memory, the value changes are read line by
+    # line. Signals are matched by their leaf name in the top scope.
+
+    def __init__(self, f, signals, top="prbs_tb"):
+        self.f = f
+        self.ids = {}
+        self.widths = {}
+        scope = []
+        for line in f:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == "$scope":
+                scope.append(tokens[2])
+            elif tokens[0] == "$upscope":
+                scope.pop()
+            elif tokens[0] == "$var":
+                width, code, name = int(tokens[2]), tokens[3], tokens[4]
+                if name in signals and scope[-1:] == [top]:
+                    self.ids.setdefault(code, []).append(name)
+                    self.widths[name] = width
+            elif tokens[0] == "$enddefinitions":
+                break
+
+        missing = set(signals) - set(self.widths)
+        if missing:
+            raise ValueError("signals not found in %s scope: %s" % (top, ", ".join(sorted(missing))))
+        self.values = dict.fromkeys(signals, 0)
+
+    def changes(self):
+        # Yield each timestamp with the changes made in it, a dict of name to
+        # value. X/U/Z bits read as 0.
+        time = 0
+        block = {}
+        ids = self.ids
+        for line in self.f:
+            c = line[:1]
+            if c == "#":
+                if block:
+                    yield time, block
+                    block = {}
+                time = int(line[1:])
+            elif c in "01xXzZuU":
+                code = line[1:].strip()
+                if code in ids:
+                    for name in ids[code]:
+                        block[name] = 1 if c == "1" else 0
+            elif c in "bB":
+                value, code = line[1:].split()
+                if code in ids:
+                    value = value.translate(BINARY)
+                    for name in ids[code]:
+                        block[name] = int(value, 2)
+        if block:
+            yield time, block
+
+    def edges(self, clock="clk"):
+        # Yield (time, before, after) at every rising edge of clock: the
+        # tracked values going into the edge and the values it produced.
+        values = self.values
+        for time, block in self.changes():
+            before = dict(values)
+            values.update(block)
+            if block.get(clock) == 1 and before[clock] == 0:
+                yield time, before, dict(values)
+
+
+BINARY = str.maketrans("xXzZuUwWlLhH-", "0000000000100")
+
+SIGNALS = ("clk", "init_gen", "init_mon", "initial_state", "polynomial", "prbs_sel",
+           "error_insert", "error_mask", "data_in", "data_req", "prbs_data", "prbs_valid",
+           "sync_manual", "sync_threshold", "count_reset", "data_count", "error_count")
+
+
+def check(f, chunk=2**16, toggle_control=True, counter_w=32):
+    # Check prbs_tb's prbs_data against prbs_model.prbs_gen and data_count/
+    # error_count against prbs_model.prbs_mon, chunk clocks at a time. Returns
+    # a report with the first divergence (or None) and summary stats.
+    reader = vcd_reader(f, SIGNALS)
+    gen = None
+    mon = None
+    report = {"clocks": 0, "checked": 0, "requests": 0, "divergence": None,
+              "data_count": 0, "error_count": 0}
+    pending = []
+
+    def check_gen(rows):
+        inputs = [[before[name] for _, before, _ in rows]
+                  for name in ("data_req", "error_insert", "error_mask", "prbs_sel", "data_in", "init_gen",
+                               "initial_state")]
+        np = prbs31.np
+        data_req, error_insert, error_mask, prbs_sel, data_in, init, initial_state = (
+            np.array(x, dtype=np.uint64) for x in inputs)
+        # every init reloads initial_state, the wrap tests change it
+        out = gen.run(data_req, error_insert, error_mask, prbs_sel, data_in, init, initial_state)
+        seen = np.array([after["prbs_data"] for _, _, after in rows], dtype=np.uint64)
+        bad = np.flatnonzero(out != seen)
+        report["requests"] += int(np.count_nonzero(data_req))
+        if len(bad):
+            time, _, _ = rows[bad[0]]
+            return (time, "prbs_data", int(out[bad[0]]), int(seen[bad[0]]))
+        return None
+
+    def step_mon(model, before):
+        model.sync_manual = before["sync_manual"]
+        model.count_reset = before["count_reset"]
+        model.sync_threshold = before["sync_threshold"]
+        model.initial_state = before["initial_state"]
+        model.step(before["prbs_data"], before["prbs_valid"], before["init_mon"])
+
+    def check_mon(rows):
+        for time, before, after in rows:
+            step_mon(mon, before)
+            for name in ("data_count", "error_count"):
+                if getattr(mon, name) != after[name]:
+                    return (time, name, getattr(mon, name), after[name])
+        return None
+
+    def flush():
+        gen_rows = [row for row in pending if row[3]]
+        mon_rows = [row[:3] for row in pending if row[4]]
+        found = []
+        if gen_rows:
+            found.append(check_gen([row[:3] for row in gen_rows]))
+        if mon_rows:
+            found.append(check_mon(mon_rows))
+        found = [d for d in found if d is not None]
+        del pending[:]
+        if found:
+            return min(found)
+        return None
+
+    for time, before, after in reader.edges():
+        report["clocks"] += 1
+        # the models start at the first init of each block
+        if gen is None and before["init_gen"]:
+            length = reader.widths["initial_state"]
+            gen = prbs_model.prbs_gen(before["initial_state"], length, before["polynomial"],
+                                      reader.widths["prbs_data"], toggle_control)
+        if mon is None and before["init_mon"]:
+            mon = prbs_model.prbs_mon(before["initial_state"], reader.widths["initial_state"],
+                                      before["polynomial"], before["sync_threshold"],
+                                      counter_w, toggle_control)
+        if gen is None and mon is None:
+            continue
+
+        pending.append((time, before, after, gen is not None, mon is not None))
+        report["checked"] += 1
+        if len(pending) >= chunk:
+            report["divergence"] = flush()
+            if report["divergence"]:
+                break
+        report["data_count"] = after["data_count"]
+        report["error_count"] = after["error_count"]
+
+    if pending and report["divergence"] is None:
+        report["divergence"] = flush()
+    return report
+
+
+if __name__ == '__main__':
+    # python prbs_vcd.py prbs.vcd --toggle-control false
+    parser = argparse.ArgumentParser(description="Check a prbs_tb VCD against the prbs_model.py models")
+    parser.add_argument("vcd")
+    parser.add_argument("--toggle-control", default=os.environ.get("PRBS_TOGGLE_CONTROL", "true").lower(),
+                        choices=("true", "false"), help="the TOGGLE_CONTROL generic of the build")
+    args = parser.parse_args()
+
+    with open(args.vcd) as f:
+        report = check(f, toggle_control=args.toggle_control == "true")
+
+    print("Clocks: ", report["clocks"])
+    print("Checked: ", report["checked"])
+    print("Data requests: ", report["requests"])
+    print("Data count: ", report["data_count"])
+    print("Error count: ", report["error_count"])
+    if report["divergence"]:
+        time, name, expected, seen = report["divergence"]
+        print("First divergence at", time, name, "expected", hex(expected), "got", hex(seen))
+        sys.exit(1)
+    print("No divergence")
@@ -0,0 +1,62 @@
+
+import cocotb
+from cocotb.triggers import ClockCycles, Edge, First, RisingEdge, Timer
+
+
+# Wait coroutines for the cocotb tests. They wake on value changes or skip
+# ahead a predicted number of clocks instead of reading the counters at every
+# clock edge. Each returns at a rising edge of clk (or at once if there is
+# nothing to wait for), where the signal values read are the ones going into
+# that edge, the same as after await RisingEdge(clk).
+
+
+async def clock_cycles(clk, n, period=None, units="ns"):
+    # n rising edges of clk. Given the clock period, everything after the first
+    # edge is skipped with one Timer landing half a period before the last
+    # edge, rather than a callback per edge.
+    if period is None or n <= 2:
+        await ClockCycles(clk, n)
+        return
+    await RisingEdge(clk)
+    await Timer((n - 1) * period - period / 2, units)
+    await RisingEdge(clk)
+
+
+async def wait_value(clk, sig, predicate):
+    # Wait until predicate(sig) holds, waking only when sig changes.
+    if predicate(sig.value.integer):
+        return sig.value.integer
+    while not predicate(sig.value.integer):
+        await Edge(sig)
+    await RisingEdge(clk)
+    return sig.value.integer
+
+
+async def wait_error_change(clk, errors):
+    # Wait for the error counter to move off its current value.
+    start = errors.value.integer
+    return await wait_value(clk, errors, lambda v: v != start)
+
+
+async def wait_count_at_least(clk, count, n, period=None, units="ns", step=1):
+    # Wait until count >= n. A counter that goes up by at most step a clock
+    # (DATA_W for data_count) cannot get there in fewer than
+    # ceil((n - count) / step) clocks, so those are skipped without looking
+    # at it.
+    value = count.value.integer
+    while value < n:
+        await clock_cycles(clk, -(-(n - value) // step), period, units)
+        value = count.value.integer
+    return value
+
+
+async def wait_count_clean(clk, count, n, errors, period=None, units="ns", step=1):
+    # wait_count_at_least() that fails as soon as errors moves off 0.
+    waiter = cocotb.start_soon(wait_count_at_least(clk, count, n, period, units, step))
+    while not waiter.done():
+        await First(waiter, Edge(errors))
+        if errors.value.integer != 0:
+            waiter.kill()
+            break
+    assert errors.value.integer == 0, "Unexpected error!"
+    return count.value.integer
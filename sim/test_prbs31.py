@@ -0,0 +1,66 @@
+
+# pytest checks of prbs31.py: the bulk paths against stepping the LFSR one
+# bit at a time. cd sim && python -m pytest -q
+
+import numpy as np
+import pytest
+
+import prbs31
+
+
+def stepped(model, n_bits):
+    # output bits of n_bits step() calls, the new register bit each time
+    bits = []
+    for _ in range(n_bits):
+        model.step()
+        bits.append((model.lfsr & 1) ^ model.invert)
+    return np.array(bits, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("name", ["PRBS7", "PRBS13", "PRBS31", "PRBS15_INV"])
+@pytest.mark.parametrize("kind", ["example", "rtl"])
+def test_generate_matches_step(name, kind):
+    prbs = prbs31.PRBS[name]
+    model = getattr(prbs, kind)(start=0x5A)
+    bulk = getattr(prbs, kind)(start=0x5A)
+
+    expect = stepped(model, 3000)
+    bits = bulk.generate(3000, packed=False)
+    assert (bits == expect).all()
+    assert bulk.lfsr == model.lfsr
+    assert (bulk.count0, bulk.count1) == (model.count0, model.count1)
+
+    # packed output is the same bits, MSB first, and carries on the stream
+    packed = bulk.generate(800)
+    assert (np.unpackbits(packed) == stepped(model, 800)).all()
+    assert bulk.lfsr == model.lfsr
+
+
+@pytest.mark.parametrize("name", ["PRBS7", "PRBS9", "PRBS13", "PRBS23", "PRBS31"])
+def test_identify(name):
+    # the registry polynomial back from 2 * length bits of its output, with
+    # the state that carries on the stream
+    prbs = prbs31.PRBS[name]
+    model = prbs.example(start=0x3)
+    bits = model.generate(2 * prbs.length, packed=False)
+    poly_bits, length, state = prbs31.identify(bits)
+    assert (poly_bits, length) == (prbs.poly_bits, prbs.length)
+    assert state == model.lfsr
+    assert prbs31.lookup(poly_bits, length) == name
+
+
+def test_identify_needs_enough_bits():
+    prbs = prbs31.PRBS["PRBS31"]
+    with pytest.raises(ValueError):
+        prbs31.identify(prbs.example().generate(40, packed=False))
+    with pytest.raises(ValueError):
+        prbs31.identify([0] * 100)
+
+
+def test_identify_windows_tolerates_errors():
+    prbs = prbs31.PRBS["PRBS13"]
+    model = prbs.example(start=0x77)
+    bits = model.generate(2000, packed=False)
+    bits[[100, 700, 701, 1500]] ^= 1
+    poly_bits, length, state = prbs31.identify_windows(bits, max_length=32)
+    assert (poly_bits, length, state) == (prbs.poly_bits, prbs.length, model.lfsr)
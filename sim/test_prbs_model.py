@@ -0,0 +1,163 @@
+
+# pytest checks of the software models against each other, no simulator
+# needed: cd sim && python -m pytest -q
+
+import pytest
+
+import prbs31
+import prbs_model
+import prbs_sim
+
+
+def loopback_wrap_gap(name, start, before, generator_w, toggle_control):
+    # prbs_tb around the models, clock by clock as loopback.run_over_wrap()
+    # drives it: both ends loaded with the state before steps short of
+    # start and a manual sync, then data_req held high. Returns before less
+    # data_count at the clock the generator register is back at start.
+    prbs = prbs31.PRBS[name]
+    state = prbs31.lfsr_state_at(start, prbs.poly, prbs.length, prbs.mask - before)
+    gen = prbs_model.prbs_gen(state, prbs.length, prbs.poly, toggle_control=toggle_control)
+    mon = prbs_model.prbs_mon(state, generator_w, prbs.poly, toggle_control=toggle_control)
+
+    # restart_monitor(generator=True): init with sync_manual high, then
+    # sync_manual back low after the release unless in toggle mode
+    control = [(1, 1), (0, 1)] + [(0, int(toggle_control))] * (before + 10 * generator_w)
+    valid = 0
+    for init, sync_manual in control:
+        mon.sync_manual = sync_manual
+        data = gen.data_out
+        gen.step(1, init=init)
+        mon.step(data, valid, init=init)
+        valid = int(not init)
+        if not init and gen.lfsr & prbs.mask == start:
+            return before - mon.data_count
+    raise AssertionError("generator did not wrap")
+
+
+def mon_state(mon):
+    return (mon.lfsr, mon.sync_bits, mon.data_count, mon.error_count, mon.errors, mon.count_update, mon.syncs)
+
+
+@pytest.mark.parametrize("sync_threshold", [0, 20])
+@pytest.mark.parametrize("invert", [False, True])
+def test_process_matches_step(sync_threshold, invert):
+    # PRBS13 received from a different seed, so the monitor has to sync
+    # first, then a few bit errors and a burst that passes the threshold.
+    # The register is GENERATOR_W wide as in prbs_tb.
+    np = prbs31.np
+    prbs = prbs31.PRBS["PRBS13"]
+    bits = prbs31.lfsr_generate(0x1234, prbs.poly, prbs.length, 30_000, packed=False)[0]
+    bits[[500, 9000, 9001, 20_000]] ^= 1
+    bits[12_000:12_200] ^= np.uint8(1)
+    bits ^= np.uint8(invert)
+
+    def monitor():
+        mon = prbs_model.prbs_mon(0x2, prbs_sim.GENERATOR_W, prbs.poly, sync_threshold=sync_threshold,
+                                  invert=invert)
+        mon.sync_manual = 1
+        return mon
+
+    stepped = monitor()
+    for bit in bits:
+        stepped.step(int(bit))
+    bulk = monitor()
+    bulk.process(bits, block=4096)
+
+    assert mon_state(bulk) == mon_state(stepped)
+    if sync_threshold == 0:
+        # locked after the first sync, each flipped bit is one error
+        assert stepped.error_count == 204
+    else:
+        assert stepped.syncs > 1
+
+
+@pytest.mark.parametrize("name, start", [("PRBS13", 0x2), ("PRBS31", 0x7FFF0000)])
+@pytest.mark.parametrize("toggle_control", [True, False])
+def test_wrap_gap(name, start, toggle_control):
+    # the bound run_over_wrap() asserts on the RTL, 4096 steps before the
+    # wrap and the length of the register, where it wraps mid sync
+    for before in (4096, prbs31.PRBS[name].length):
+        gap = loopback_wrap_gap(name, start, before, prbs_sim.GENERATOR_W, toggle_control)
+        assert gap == min(before, prbs_sim.GENERATOR_W - 1 + prbs_sim.WRAP_LATENCY)
+
+
+def test_sliced_matches_per_lane():
+    # process_sliced() against each lane through prbs_mon.process(), with
+    # a few lanes hit by errors and one on a different polynomial
+    np = prbs31.np
+    prbs = prbs31.PRBS["PRBS13"]
+    other = prbs31.PRBS["PRBS7"]
+    n = 20_000
+    lanes = 40
+
+    def monitors():
+        mons = [prbs_model.prbs_mon(0x2 + 7 * j, prbs.length, prbs.poly, sync_threshold=20) for j in range(lanes)]
+        mons[5] = prbs_model.prbs_mon(0x5, other.length, other.poly)
+        return mons
+
+    bits = np.empty((lanes, n), dtype=np.uint8)
+    for j, mon in enumerate(monitors()):
+        bits[j] = prbs31.lfsr_generate(mon.initial_state, mon.poly, mon.len, n, packed=False)[0]
+    bits[3, [100, 5000, 5001]] ^= 1
+    bits[9, 2000:2100] ^= 1
+    bits[5, 7000] ^= 1
+
+    per_lane = prbs_model.prbs_mon_lanes(monitors())
+    per_lane.process(bits)
+    sliced = prbs_model.prbs_mon_lanes(monitors())
+    sliced.process_sliced(prbs31.slice_lanes(bits), block=4096)
+
+    assert sliced.data_count() == per_lane.data_count()
+    assert sliced.error_count() == per_lane.error_count()
+    assert sliced.syncs() == per_lane.syncs()
+    assert [m.lfsr for m in sliced.lanes] == [m.lfsr for m in per_lane.lanes]
+    assert per_lane.error_count()[3] == 3
+
+
+def test_generate_sliced_matches_generate():
+    prbs = prbs31.PRBS["PRBS31"]
+    states = [prbs31.lfsr_state_at(1, prbs.poly, prbs.length, 1000 * j) for j in range(64)]
+    words, final = prbs31.lfsr_generate_sliced(states, prbs.poly, prbs.length, 5000)
+    bits = prbs31.unslice_lanes(words, 64)
+    for j, state in enumerate(states):
+        expect, expect_final = prbs31.lfsr_generate(state, prbs.poly, prbs.length, 5000, packed=False)
+        assert (bits[j] == expect).all()
+        assert final[j] == expect_final
+
+
+@pytest.mark.parametrize("data_w", [1, 8])
+@pytest.mark.parametrize("toggle_control", [True, False])
+def test_run_matches_step(data_w, toggle_control):
+    # random data_req, error_insert, prbs_sel and data_in with two inits,
+    # one of them loading a new initial_state
+    np = prbs31.np
+    rng = np.random.default_rng(11)
+    prbs = prbs31.PRBS["PRBS31"]
+    n = 5000
+    data_req = rng.random(n) < 0.6
+    error_insert = (rng.random(n) < 0.02).astype(np.uint8)
+    if toggle_control:
+        error_insert = np.cumsum(error_insert, dtype=np.uint8) & 1
+    prbs_sel = (rng.random(n) < 0.9).astype(np.uint8)
+    data_in = rng.integers(0, 2**data_w, n, dtype=np.uint64)
+    error_mask = rng.integers(1, 2**data_w, n, dtype=np.uint64)
+    init = np.zeros(n, dtype=np.uint8)
+    init[[1000, 3000]] = 1
+    initial_state = np.full(n, 0x7FFF0000, dtype=np.uint64)
+    initial_state[3000] = 0x1234567
+
+    def generator():
+        return prbs_model.prbs_gen(0x7FFF0000, prbs.length, prbs.poly, data_w, toggle_control)
+
+    stepped = generator()
+    expect = []
+    for k in range(n):
+        if init[k]:
+            stepped.initial_state = int(initial_state[k])
+        expect.append(stepped.step(int(data_req[k]), int(error_insert[k]), int(error_mask[k]), int(prbs_sel[k]),
+                                   int(data_in[k]), int(init[k])))
+    bulk = generator()
+    out = bulk.run(data_req, error_insert, error_mask, prbs_sel, data_in, init, initial_state)
+
+    assert out.tolist() == expect
+    assert (bulk.lfsr, bulk.error_arm, bulk.error_insert_d) == (stepped.lfsr, stepped.error_arm, stepped.error_insert_d)